@@ -18,7 +18,7 @@ router = APIRouter(
 @router.get("/{user_id}")
 async def get_credits(user_id: int,
                       session: SessionDep):
-    user = read_user(user_id, session)
+    user = await read_user(user_id, session)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -35,14 +35,14 @@ async def get_credits(user_id: int,
 async def add_credits(user_id: int,
                       data: CreditsRequest,
                       session: SessionDep):
-    user = read_user(user_id, session)
+    user = await read_user(user_id, session)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     user.current_credit += data.credits
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
     
     return {"user_id": user.id, 
             "current_credit": user.current_credit, 
@@ -53,7 +53,7 @@ async def add_credits(user_id: int,
 async def remove_credits(user_id: int,
                          data: CreditsRequest,
                          session: SessionDep):
-    user = read_user(user_id, session)
+    user = await read_user(user_id, session)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -61,8 +61,8 @@ async def remove_credits(user_id: int,
     if user.current_credit < 0 and user.is_active:
         user.current_credit = 0.0
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
     
     return {"user_id": user.id, 
             "current_credit": user.current_credit, 
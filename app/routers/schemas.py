@@ -14,7 +14,7 @@ class Item(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     title: str
     content: str
-    date: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    date: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
     cost_credits: float = Field(default=0.0)
     tokens: int = Field(default=0)
     user_id: int
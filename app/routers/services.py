@@ -1,11 +1,10 @@
 import numpy as np
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import case, or_, update
 
 from ..dependencies import get_token_header
 from app.routers.schemas import User, UserUpdate, DocumentInput, DocumentOutput, OutputSummary, Item
-from app.routers.users import read_user, update_user
-from app.routers.items import create_item
 from app.routers.credits import get_credits, add_credits, remove_credits
 from app.database import *
 
@@ -22,64 +21,73 @@ def fake_llm(document: DocumentInput) -> DocumentOutput:
         summary="This is a fake summary",
     )
     
-def trigger_create_item(title: str, 
-                        content: str,
-                        cost_credits: int,
-                        tokens: int,
+UNLIMITED_CREDIT = -1.0 # current_credit de planos sem limite; nunca é debitado
+SERVICE_COST = 1.0 # 1 credit per service request
+
+async def debit_credits(session: AsyncSession,
                         user_id: int,
-                        session: SessionDep):
-    item_data = Item(
-        title=title,
-        content=content,
-        cost_credits=cost_credits,
-        tokens=tokens,
-        user_id=user_id
+                        credits: float,
+                        tokens: int,
+                        document: DocumentInput) -> User | None:
+    """
+    Charges `credits` and records the usage Item in a single transaction.
+    The balance check is part of the UPDATE itself, so concurrent requests
+    cannot both pass it and overdraw. Returns the updated user, or None when
+    the user is missing, inactive or out of credits (nothing is written).
+    """
+    statement = (
+        update(User)
+        .where(User.id == user_id,
+               User.is_active,
+               or_(User.current_credit >= credits, User.current_credit == UNLIMITED_CREDIT))
+        .values(current_credit=case((User.current_credit == UNLIMITED_CREDIT, User.current_credit),
+                                    else_=User.current_credit - credits),
+                tokens=User.tokens + tokens,
+                requests=User.requests + 1)
+        .returning(User)
     )
-    item = create_item(item_data, session)
-    return item
+    row = (await session.exec(statement)).one_or_none()
+    if row is None:
+        await session.rollback()
+        return None
+    user = row[0]
+    session.add(Item(title=document.title,
+                     content=document.content,
+                     cost_credits=credits,
+                     tokens=tokens,
+                     user_id=user_id))
+    await session.commit()
+    return user
 
 @router.get("/summary/{user_id}")
 async def to_summary(user_id: int,
                      session: SessionDep,
                      document: DocumentInput) -> OutputSummary:
-    user = read_user(user_id, session)
-    if not user:
+    # Checagem antes do serviço: usuário sem saldo não gasta uma chamada ao LLM
+    existing = await session.get(User, user_id)
+    if not existing:
         raise HTTPException(status_code=404, detail="User not found")
-    elif not user.is_active:
+    elif not existing.is_active:
         raise HTTPException(status_code=400, detail="User is not active")
-    
-    current_credit = user.current_credit
-    credits = 1.0 # 1 credit per service request
-    is_ok = (current_credit >= credits) or (current_credit == -1.0) 
-    if not is_ok:
+    elif existing.current_credit != UNLIMITED_CREDIT and existing.current_credit < SERVICE_COST:
         raise HTTPException(status_code=400, detail="Not enough credits")
-    
+    # Encerra a transação de leitura: o débito abaixo lê o saldo atual, não o desta checagem
+    await session.rollback()
+
     # Request do serviço
     response = fake_llm(document)
-    tokens_random = np.random.randint(1_000, 5_000)
-    request = 1
+    tokens_random = int(np.random.randint(1_000, 5_000))
     # -------------------
-    
-    # Faz update do usuário
-    user.tokens += tokens_random
-    user.requests += request
-    user.current_credit -= credits if current_credit != -1.0 else 0.0
 
-    user = update_user(user_id, user, session)
-    
-    TRIGGER = True
-    if TRIGGER:
-        item = trigger_create_item(
-            title=document.title,
-            content=document.content,
-            cost_credits=credits,
-            tokens=tokens_random,
-            user_id=user_id,
-            session=session
-        )
-    
+    # Débito, contadores e Item de uso: um UPDATE condicional e um commit.
+    # Nada é cobrado se o serviço falhar; se outra request gastou o saldo nesse
+    # meio tempo, o UPDATE não casa e a request é recusada sem débito.
+    user = await debit_credits(session, user_id, SERVICE_COST, tokens_random, document)
+    if user is None:
+        raise HTTPException(status_code=400, detail="Not enough credits")
+
     return OutputSummary(
         user=user,
         document=document,
         summary=response.summary
-    )
\ No newline at end of file
+    )
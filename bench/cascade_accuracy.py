@@ -0,0 +1,108 @@
+"""
+Grades a reference set with and without cascade mode and reports, per
+mode, the mean absolute error against the reference scores, how often the
+grade lands in the same band, the escalation rate and the mean latency.
+
+Each reference line is one graded essay: {"path": "/call-essay", "body":
+{"essay": "...", "exam_type": "sat", "model_name": "gemma3n:e4b"},
+"reference": {"reading": 3, "analysis": 2, "writing": 3}}. For
+/call-model-competencia the reference is {"nota": 160}.
+
+    python bench/cascade_accuracy.py references.jsonl --target http://localhost:8000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cascade import COMPETENCIA_RUBRIC, ESSAY_RUBRICS
+
+
+def load_references(path):
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                entries.append(json.loads(line))
+    if not entries:
+        raise SystemExit(f"Empty reference set: {path}")
+    return entries
+
+
+def rubric_for(entry):
+    if entry["path"].rstrip("/") == "/call-model-competencia":
+        return COMPETENCIA_RUBRIC
+    return ESSAY_RUBRICS.get((entry["body"].get("exam_type") or "").lower())
+
+
+def band(rubric, score):
+    return sum(score > edge for edge in rubric.edges)
+
+
+def extract_json(text):
+    # Sem cascata o modelo responde em texto livre, geralmente com o JSON num bloco ```json
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON object in the response")
+    return json.loads(text[start:end + 1])
+
+
+def grade(client, entry, cascade):
+    body = {**entry["body"], "cascade": cascade, "fresh": True}  # sem reaproveitar correções anteriores
+    started = time.perf_counter()
+    response = client.post(entry["path"], json=body)
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    data = response.json()
+    return extract_json(data["response"]), (data.get("cascade") or {}).get("escalated", False), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("references")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    entries = [e for e in load_references(args.references) if rubric_for(e) is not None]
+    if not entries:
+        raise SystemExit("No entries with a structured rubric (competência, sat, exames_nacionais, gaokao, ielts).")
+
+    with httpx.Client(base_url=args.target, timeout=args.timeout) as client:
+        for cascade in (False, True):
+            stats = defaultdict(float)
+            for entry in entries:
+                rubric = rubric_for(entry)
+                try:
+                    result, escalated, elapsed = grade(client, entry, cascade)
+                    predicted = rubric.schema.model_validate(result)
+                except (httpx.HTTPError, ValueError) as e:
+                    stats["errors"] += 1
+                    print(f"  error: {e}", file=sys.stderr)
+                    continue
+                reference = entry["reference"]
+                errors = [abs(getattr(predicted, field) - reference[field]) / (high - low)
+                          for field, (low, high) in rubric.scores.items() if field in reference]
+                reference_score = sum((reference[f] - low) / (high - low) for f, (low, high) in rubric.scores.items()
+                                      if f in reference) / max(1, len(errors))
+                stats["graded"] += 1
+                stats["error"] += sum(errors) / max(1, len(errors))
+                stats["same_band"] += band(rubric, rubric.normalized(predicted)) == band(rubric, reference_score)
+                stats["escalated"] += escalated
+                stats["seconds"] += elapsed
+
+            graded = stats["graded"] or 1
+            print(f"{'cascade' if cascade else 'direct':<8} graded={int(stats['graded'])} errors={int(stats['errors'])} "
+                  f"mae={stats['error'] / graded:.3f} same_band={stats['same_band'] / graded:.1%} "
+                  f"escalated={stats['escalated'] / graded:.1%} mean={stats['seconds'] / graded:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
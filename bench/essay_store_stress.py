@@ -0,0 +1,131 @@
+"""
+Stress check of the essay store with several processes, each with several
+threads, hammering create/update/delete on the same files (what uvicorn
+--workers N does to storage/). A small compaction threshold keeps the
+journal rotating during the run.
+
+Each thread only updates and deletes the essays it created, so the expected
+final state is known. At the end the store is reopened from disk and the
+check fails on duplicate IDs, lost or stale essays, or resurrected deletes.
+
+    python bench/essay_store_stress.py --processes 4 --threads 8 --ops 300
+    python bench/essay_store_stress.py --backend sqlite
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.essay_store import EssayStore, create_essay_store
+
+
+def open_store(args, path):
+    if args.backend == "journal":
+        store = EssayStore(path, compact_min_records=args.compact_every)
+    else:
+        store = create_essay_store(path, backend=args.backend)
+    store.open()
+    return store
+
+
+def worker(args, path, seed, results):
+    store = open_store(args, path)
+    expected, created = {}, []
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        mine, deleted = {}, set()
+        for i in range(args.ops):
+            op = rng.random()
+            if not mine or op < 0.5:
+                item = store.create({"essay": f"{thread_seed}-{i}", "grade": rng.randint(0, 1000),
+                                     "exam_type": rng.choice(["enem", "sat"]), "feedback": ""})
+                mine[item["essay_id"]] = item
+                with lock:
+                    created.append(item["essay_id"])
+            elif op < 0.8:
+                essay_id = rng.choice(list(mine))
+                mine[essay_id] = store.update(essay_id, {**mine[essay_id], "grade": rng.randint(0, 1000)})
+            else:
+                essay_id = rng.choice(list(mine))
+                assert store.delete(essay_id), f"essay {essay_id} vanished before its owner deleted it"
+                del mine[essay_id]
+                deleted.add(essay_id)
+        with lock:
+            expected.update(mine)
+            expected.update(dict.fromkeys(deleted))
+
+    threads = [threading.Thread(target=run, args=(seed * 1000 + t,)) for t in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+    results.put((created, {k: (v["essay"], v["grade"]) if v else None for k, v in expected.items()}))
+
+
+def run_bench(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.json")
+        results = multiprocessing.Queue()
+        started = time.perf_counter()
+        processes = [multiprocessing.Process(target=worker, args=(args, path, p, results))
+                     for p in range(args.processes)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        if any(process.exitcode for process in processes):
+            return ["a worker process failed"]
+
+        created = [essay_id for ids, _ in outcomes for essay_id in ids]
+        expected = {k: v for _, state in outcomes for k, v in state.items()}
+        store = open_store(args, path)
+        stored = {item["essay_id"]: (item["essay"], item["grade"]) for item in store.list()}
+        store.close()
+
+    problems = []
+    if len(created) != len(set(created)):
+        problems.append(f"{len(created) - len(set(created))} duplicate essay_ids handed out")
+    for essay_id, value in expected.items():
+        if value is None and essay_id in stored:
+            problems.append(f"essay {essay_id} deleted but still stored")
+        elif value is not None and stored.get(essay_id) != value:
+            problems.append(f"essay {essay_id}: expected {value}, stored {stored.get(essay_id)}")
+    if set(stored) - set(expected):
+        problems.append(f"{len(set(stored) - set(expected))} stored essays nobody created")
+
+    total = args.processes * args.threads * args.ops
+    print(f"{args.backend}: {args.processes} processes x {args.threads} threads, {total} ops in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} ops/s), {len(created)} created, {len(stored)} stored")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=300, help="operations per thread")
+    parser.add_argument("--backend", choices=["journal", "sqlite"], default="journal")
+    parser.add_argument("--compact-every", type=int, default=200, help="journal records before compaction")
+    args = parser.parse_args()
+
+    problems = run_bench(args)
+    for problem in problems[:20]:
+        print(f"  FAIL {problem}")
+    if problems:
+        raise SystemExit(1)
+    print("  OK: unique IDs, no lost updates, no resurrected deletes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Fake Ollama server for load tests on machines without a GPU.
+
+Implements /api/chat, /api/generate, /api/tags, /api/pull, /api/delete and
+/api/version with a configurable time-to-first-token, token rate and model
+load delay. Requests with a JSON schema in `format` get a random instance of
+that schema, so the structured endpoints of main.py parse the output.
+
+    python bench/fake_ollama.py --port 11435 --token-rate 40 --ttft 0.3
+    OLLAMA_HOST=http://127.0.0.1:11435 python main.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LOREM = ("a prova exige raciocínio sobre contexto histórico econômico social e cultural "
+         "considere as causas consequências e os principais atores envolvidos no tema").split()
+
+config = {"token_rate": 50.0, "ttft": 0.05, "load_delay": 0.0, "array_items": 5, "tokens": 120,
+          "models": ["gemma3n:e2b", "gemma3n:e4b", "gemma3:1b"]}
+loaded = set()
+app = FastAPI()
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def words(n):
+    return " ".join(random.choice(LOREM) for _ in range(n))
+
+
+def sample(schema, defs):
+    if "$ref" in schema:
+        return sample(defs[schema["$ref"].split("/")[-1]], defs)
+    if "enum" in schema:
+        return random.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {k: sample(v, defs) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        n = max(config["array_items"], schema.get("minItems", 0))
+        n = min(n, schema.get("maxItems", n))
+        return [sample(schema.get("items", {}), defs) for _ in range(n)]
+    if kind == "integer":
+        return random.randint(schema.get("minimum", 0), schema.get("maximum", 200))
+    if kind == "number":
+        return round(random.uniform(0, 1), 2)
+    if kind == "boolean":
+        return True
+    return words(random.randint(6, 14))
+
+
+def completion(fmt):
+    if isinstance(fmt, dict):
+        return json.dumps(sample(fmt, fmt.get("$defs", {})), ensure_ascii=False)
+    if fmt == "json":
+        return json.dumps({"response": words(20)}, ensure_ascii=False)
+    return words(config["tokens"])
+
+
+def pieces(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def generate(body, chat):
+    model = body.get("model", "")
+    started = time.perf_counter()
+    load = 0.0
+    if model not in loaded:
+        load = config["load_delay"]
+        loaded.add(model)
+    await asyncio.sleep(load + config["ttft"])
+    tokens = pieces(completion(body.get("format")))
+    delay = 1.0 / config["token_rate"] if config["token_rate"] > 0 else 0
+    prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", [])) if chat else len(body.get("prompt", ""))
+    eval_started = time.perf_counter()
+    for token in tokens:
+        if chat:
+            yield {"model": model, "created_at": now(), "message": {"role": "assistant", "content": token}, "done": False}
+        else:
+            yield {"model": model, "created_at": now(), "response": token, "done": False}
+        await asyncio.sleep(delay)
+    final = {
+        "model": model, "created_at": now(), "done": True, "done_reason": "stop",
+        "total_duration": int((time.perf_counter() - started) * 1e9),
+        "load_duration": int(load * 1e9),
+        "prompt_eval_count": max(1, prompt_chars // 4),
+        "prompt_eval_duration": int(config["ttft"] * 1e9),
+        "eval_count": len(tokens),
+        "eval_duration": int((time.perf_counter() - eval_started) * 1e9),
+    }
+    if chat:
+        final["message"] = {"role": "assistant", "content": ""}
+    else:
+        final["response"] = ""
+    yield final
+
+
+async def respond(body, chat):
+    if body.get("stream", True):
+        async def lines():
+            async for part in generate(body, chat):
+                yield json.dumps(part, ensure_ascii=False) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    text, final = "", None
+    async for part in generate(body, chat):
+        text += part["message"]["content"] if chat else part["response"]
+        final = part
+    if chat:
+        final["message"]["content"] = text
+    else:
+        final["response"] = text
+    return final
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    return await respond(await request.json(), chat=True)
+
+
+@app.post("/api/generate")
+async def generate_endpoint(request: Request):
+    return await respond(await request.json(), chat=False)
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": m, "model": m, "size": 1_000_000, "digest": "fake"} for m in config["models"]]}
+
+
+@app.get("/api/version")
+async def version():
+    return {"version": "0.0.0-fake"}
+
+
+@app.delete("/api/delete")
+async def delete(request: Request):
+    body = await request.json()
+    if body.get("model") in config["models"]:
+        config["models"].remove(body["model"])
+    return {}
+
+
+@app.post("/api/pull")
+async def pull(request: Request):
+    body = await request.json()
+    model = body.get("model") or body.get("name")
+
+    async def progress():
+        total = 100_000_000
+        yield json.dumps({"status": "pulling manifest"}) + "\n"
+        for completed in range(0, total + 1, total // 20):
+            yield json.dumps({"status": "pulling fake", "digest": "sha256:fake", "total": total, "completed": completed}) + "\n"
+            await asyncio.sleep(0.05)
+        if model not in config["models"]:
+            config["models"].append(model)
+        yield json.dumps({"status": "success"}) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="generated tokens per second (0 = no delay)")
+    parser.add_argument("--ttft", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="extra delay on the first call of each model")
+    parser.add_argument("--tokens", type=int, default=120, help="length of free-text completions")
+    parser.add_argument("--array-items", type=int, default=5, help="items generated for JSON schema arrays")
+    parser.add_argument("--models", default=",".join(config["models"]))
+    args = parser.parse_args()
+    config.update(token_rate=args.token_rate, ttft=args.ttft, load_delay=args.load_delay,
+                  tokens=args.tokens, array_items=args.array_items,
+                  models=[m for m in args.models.split(",") if m])
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
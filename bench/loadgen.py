@@ -0,0 +1,173 @@
+"""
+Replays a JSONL trace against the NeroEdu API and reports throughput and
+p50/p95/p99 latency per endpoint.
+
+Each trace line is one request: {"method": "POST", "path": "/call-flashcard",
+"body": {...}}. `method` defaults to POST and `body` to no body.
+
+    # against a running API
+    python bench/loadgen.py bench/traces/sample.jsonl --concurrency 8 --requests 200
+
+    # self-contained (CI): starts bench/fake_ollama.py and main.py itself
+    python bench/loadgen.py bench/traces/sample.jsonl --serve --token-rate 0 --ttft 0
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_trace(path):
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            entries.append({
+                "method": entry.get("method", "POST").upper(),
+                "path": entry["path"],
+                "body": entry.get("body"),
+            })
+    if not entries:
+        raise SystemExit(f"Empty trace: {path}")
+    return entries
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+async def run(target, entries, concurrency, total, timeout):
+    results = defaultdict(lambda: {"latency": [], "ttfb": [], "errors": 0})
+    queue = itertools.islice(itertools.cycle(entries), total)
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout) as client:
+        async def worker():
+            for entry in queue:
+                stats = results[f'{entry["method"]} {entry["path"]}']
+                started = time.perf_counter()
+                try:
+                    async with client.stream(entry["method"], entry["path"], json=entry["body"]) as response:
+                        ttfb = None
+                        async for _ in response.aiter_raw():
+                            if ttfb is None:
+                                ttfb = time.perf_counter() - started
+                        if response.status_code >= 400:
+                            stats["errors"] += 1
+                            continue
+                except httpx.HTTPError:
+                    stats["errors"] += 1
+                    continue
+                elapsed = time.perf_counter() - started
+                stats["latency"].append(elapsed)
+                stats["ttfb"].append(ttfb if ttfb is not None else elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return results, wall
+
+
+def report(results, wall):
+    header = f'{"endpoint":<34}{"ok":>6}{"err":>5}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"ttfb p50":>10}'
+    print(header)
+    print("-" * len(header))
+    total_ok = 0
+    for endpoint, stats in sorted(results.items()):
+        latency = stats["latency"]
+        total_ok += len(latency)
+        print(f'{endpoint:<34}{len(latency):>6}{stats["errors"]:>5}{len(latency) / wall:>8.1f}'
+              f'{percentile(latency, 0.50) * 1000:>9.1f}{percentile(latency, 0.95) * 1000:>9.1f}'
+              f'{percentile(latency, 0.99) * 1000:>9.1f}{percentile(stats["ttfb"], 0.50) * 1000:>10.1f}')
+    print("-" * len(header))
+    print(f"{total_ok} requests in {wall:.2f}s ({total_ok / wall:.1f} req/s)")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+def serve(args, storage_dir):
+    """Starts the fake Ollama and the API (on `storage_dir`) as subprocesses; returns (target, processes)."""
+    ollama_port, api_port = free_port(), free_port()
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(ROOT_DIR, "bench", "fake_ollama.py"),
+        "--port", str(ollama_port), "--token-rate", str(args.token_rate),
+        "--ttft", str(args.ttft), "--load-delay", str(args.load_delay),
+    ])
+    # Storage temporário: as questões falsas não podem entrar no banco de storage/
+    env = {**os.environ, "OLLAMA_HOST": f"http://127.0.0.1:{ollama_port}", "STORAGE_DIR": storage_dir}
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+        "--port", str(api_port), "--log-level", "warning",
+    ], cwd=ROOT_DIR, env=env)
+    wait_for(f"http://127.0.0.1:{ollama_port}/api/version")
+    wait_for(f"http://127.0.0.1:{api_port}/")
+    return f"http://127.0.0.1:{api_port}", [api, fake]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NeroEdu load generator")
+    parser.add_argument("trace", help="JSONL trace to replay")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=None, help="total requests (default: one pass over the trace)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--serve", action="store_true", help="start fake_ollama.py and main.py before the run")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="fake Ollama tokens/s (with --serve)")
+    parser.add_argument("--ttft", type=float, default=0.05, help="fake Ollama TTFT in seconds (with --serve)")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="fake Ollama model load delay (with --serve)")
+    args = parser.parse_args()
+
+    entries = load_trace(args.trace)
+    total = args.requests or len(entries)
+
+    processes, storage = [], None
+    target = args.target
+    if args.serve:
+        storage = tempfile.TemporaryDirectory(prefix="loadgen-storage-")
+        target, processes = serve(args, storage.name)
+    try:
+        results, wall = asyncio.run(run(target, entries, args.concurrency, total, args.timeout))
+        report(results, wall)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        if storage is not None:
+            storage.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of the per-request Python overhead of building a generation
+chain: the old per-request ChatPromptTemplate + ChatOllama construction
+versus the precompiled PromptRegistry + shared ChatOllama in src/.
+
+No Ollama server is needed; only the chain is built and the prompt rendered.
+
+    python bench/prompt_overhead.py --iterations 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_ollama.chat_models import ChatOllama
+
+from src.llm import get_llm, output_parser
+from src.prompts import EXAM_LANGUAGES, FLASHCARD_STRUCTURE, build_registry
+from src.schemas import Flashcard
+
+
+def legacy_flashcard(exam_type, model_name):
+    # Equivalente ao que /call-flashcard fazia a cada requisição
+    language = dict(EXAM_LANGUAGES)
+    template = [
+        ('system', """You will generate an educational flashcard for studying."""),
+        ('system', f"""The language of the exam is {language[exam_type]}."""),
+        ('system', f"""Consider that the flashcard should be relevant for the {exam_type} exam."""),
+        ('system', """Create the flashcard in question-answer format."""),
+        ('system', FLASHCARD_STRUCTURE),
+        ('system', "Generate a flashcard about the theme: {tema}"),
+        ('system', "Do not repeat existing questions. These subtopics are already covered: {covered}."),
+        ('system', "The question should test essential knowledge and the answer should be complete."),
+    ]
+    prompt = ChatPromptTemplate.from_messages(template)
+    llm = ChatOllama(model=model_name, temperature=round(random.uniform(0, 1), 2), seed=random.randint(0, 1000),
+                     format=Flashcard.model_json_schema())
+    return prompt | llm | StrOutputParser()
+
+
+def registry_flashcard(registry, exam_type, model_name):
+    prompt = registry.get("call-flashcard", exam_type, False, True)
+    llm = get_llm(model_name, Flashcard, temperature=round(random.uniform(0, 1), 2), seed=random.randint(0, 1000))
+    return prompt | llm | output_parser
+
+
+def bench(label, build, iterations):
+    inputs = {"tema": "revolução francesa", "covered": "iluminismo, bastilha, jacobinos"}
+    build().first.invoke(inputs)  # aquecimento
+    started = time.perf_counter()
+    for _ in range(iterations):
+        chain = build()
+        chain.first.invoke(inputs)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {elapsed / iterations * 1e6:>10.1f} us/request")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--exam-type", default="enem")
+    parser.add_argument("--model", default="gemma3n:e2b")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    registry = build_registry()
+    print(f"registry: {len(registry)} prompts compiled in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    before = bench("before", lambda: legacy_flashcard(args.exam_type, args.model), args.iterations)
+    after = bench("after", lambda: registry_flashcard(registry, args.exam_type, args.model), args.iterations)
+    print(f"speedup    {before / after:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
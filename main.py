@@ -1,23 +1,43 @@
 # main.py
-from fastapi import FastAPI, HTTPException, APIRouter
+from fastapi import FastAPI, HTTPException, APIRouter, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from pydantic import ValidationError
 from typing import List, Optional
-import requests
+import asyncio
+import contextvars
+import httpx
 import uvicorn
 import json
 import os
 import sys
 
-from src.utils import get_models_info, delete_model, example_essay, prompt_competencia_1, prompt_competencia_2, prompt_competencia_3, prompt_competencia_4, prompt_competencia_5, exams_types
+from src.utils import OLLAMA_BASE_URL, example_essay
+from src.ollama_admin import OllamaAdmin
+from src.pull_manager import PullManager
+from src.jobs import JobManager
+from src.router import ModelRouter
+from src.context_window import map_reduce_grade, num_ctx_for, prompt_tokens
+from src.cascade import CASCADE_SMALL_MODEL, COMPETENCIA_RUBRIC, ESSAY_RUBRICS, cascade_grade
+from src.prevalidation import check_essay, zero_score_response
 from src.retriever import Retriever
 from contextlib import asynccontextmanager 
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_ollama.llms import OllamaLLM
-from langchain_ollama.chat_models import ChatOllama
-from src.schemas import InputDataEssayEnem, InputSimulado, InputFlashcard, InputDataKeyTopics, OutputDataEssayEnem, InputDataEssay, Essay, InputEssay
+from src.schemas import InputDataEssayEnem, InputSimulado, InputFlashcard, InputDataKeyTopics, OutputDataEssayEnem, InputDataEssay, Essay, EssayPage, InputEssay
+from src.schemas import Question, Simulado, Flashcard, KeyTopics, CascadeInfo, DuplicateInfo
+from src.json_stream import JsonArrayStreamParser
+from src.dedupe import DedupeIndex, DedupeStore, simhash
+from src.prefetch import PrefetchStore
+from src.essay_store import create_essay_store
+from src.essay_search import EssaySearchIndex
+from src.essay_cache import GradedEssayCache
+from src.responses import EXPORT_FORMATS, json_response, stream_records
+from src.question_bank import QUESTION_BANK_MIN_UNSEEN, QuestionBank, theme_key
+from src import telemetry, tracing
+from src.disconnect import DisconnectMiddleware
+from src.prompts import build_registry
+from src.llm import get_llm, output_parser
 
 from pydantic import BaseModel
 import random
@@ -38,25 +58,11 @@ else:
 
 print("[INIT] BASE_DIR:", BASE_DIR)
 
-STORAGE_DIR = os.path.join(BASE_DIR, "storage")
+STORAGE_DIR = os.getenv("STORAGE_DIR", os.path.join(BASE_DIR, "storage"))
 VECTORSTORE_DIR = os.path.join(BASE_DIR, "vectorstore")
 DATABASE_PATH = os.path.join(STORAGE_DIR, "database.json")
 
-# =========================
-# 📦 Funções auxiliares
-# =========================
-def load_data():
-    print("[LOAD] Carregando:", DATABASE_PATH)
-    if not os.path.exists(DATABASE_PATH):
-        print("[LOAD] Criando novo database.json")
-        with open(DATABASE_PATH, "w") as f:
-            json.dump([], f)
-    with open(DATABASE_PATH, "r") as f:
-        return json.load(f)
-
-def save_data(data):
-    with open(DATABASE_PATH, "w") as f:
-        json.dump(data, f, indent=4)
+retrieve_enem = None  # preenchido no lifespan; sem vectorstore o lite_rag é ignorado
 
 # =========================
 # 🔁 Inicialização do app
@@ -73,7 +79,10 @@ async def lifespan(app: FastAPI):
             path_model=os.path.join(VECTORSTORE_DIR, model)
         )
 
-    retrieve_enem = build_retriever("data_playlists_enem.csv", "tfidf_model_enem.pkl")
+    if os.path.exists(os.path.join(VECTORSTORE_DIR, "data_playlists_enem.csv")):
+        retrieve_enem = build_retriever("data_playlists_enem.csv", "tfidf_model_enem.pkl")
+    else:
+        print("[LIFESPAN] data_playlists_enem.csv não encontrado, lite_rag desativado.")
     # retrieve_cuet = build_retriever("cuet_edital.csv", "tfidf_model_cuet_edital.pkl")
     # retrieve_exames = build_retriever("exames_nacionais_edital.csv", "tfidf_model_exames_nacionais_edital.pkl")
     # retrieve_exani = build_retriever("exani_edital.csv", "tfidf_model_exani_edital.pkl")
@@ -81,7 +90,22 @@ async def lifespan(app: FastAPI):
     # retrieve_sat = build_retriever("sat_edital.csv", "tfidf_model_sat_edital.pkl")
 
     print("[LIFESPAN] Vectorstores prontos.")
+    essay_store.open()
+    essay_search.open()
+    reindexed = await asyncio.to_thread(essay_search.sync, essay_store.iter_items())
+    print(f"[LIFESPAN] Busca de redações: {reindexed} redações reindexadas.")
+    question_bank.open()
+    graded_essays.open()
+    await job_manager.start()
     yield
+    await job_manager.stop()
+    await prefetch_buffers.aclose()
+    graded_essays.close()
+    question_bank.close()
+    essay_search.close()
+    essay_store.close()
+    await pull_manager.aclose()
+    await ollama_admin.aclose()
     print("[LIFESPAN] Encerrando servidor...")
 
 
@@ -118,117 +142,249 @@ async def lifespan(app: FastAPI):
 #     yield
 #     print("Shutdown Server...")
 
-# Helpers para manipular o JSON
-def load_data():
-    # database_file = os.path.join(STORAGE_DIR, "release/build/resources/storage/database.json")
-    database_file = DATABASE_PATH
-    if not os.path.exists(database_file):
-        with open(database_file, "w") as f:
-            json.dump([], f)
-    with open(database_file, "r") as f:
-        return json.load(f)
-
-def save_data(data):
-    database_file = DATABASE_PATH
-    with open(database_file, "w") as f:
-        json.dump(data, f, indent=4)
+# Lite RAG: traduz o tema e busca um trecho relevante no vectorstore
+async def retrieve_context(tema: str, endpoint: str, exam_type: str) -> str:
+    with tracing.span("translate"):
+        chain_translate = (
+            prompt_registry.get("translate", "")
+            | get_llm("gemma3n:e2b", temperature=0.6, seed=random.randint(0, 1000))
+            | output_parser
+        )
+        tema_translated = await chain_translate.ainvoke({"tema": tema}, config=telemetry.track(endpoint, exam_type, chain="translate"))
+    print(f"Translated theme: {tema_translated}")
+    with tracing.span("retrieve"):
+        retrieved_content = random.choice(retrieve_enem.query(tema_translated, k=4)).content
+    print(f"Retrieved content: {retrieved_content}")
+    return retrieved_content
+
+# Valida a saída estruturada do Ollama (format=<json schema>)
+def parse_structured(schema, response: str):
+    try:
+        return schema.model_validate_json(response)
+    except ValidationError as e:
+        raise HTTPException(status_code=502, detail=f"Model output does not match the {schema.__name__} schema: {e.errors()[:3]}")
+
+async def top_up_bank(exam_type: str, tema: str, model_name: str):
+    prompt = prompt_registry.get("call-simulado", exam_type)
+    llm = get_llm(model_name, Simulado, temperature=round(random.uniform(0.3, 1), 2), seed=random.randint(0, 1000))
+    try:
+        with model_router.busy(model_name):
+            response = await (prompt | llm | output_parser).ainvoke(
+                {"tema": tema}, config=telemetry.track("call-simulado", exam_type, "bank-top-up"))
+        simulado = parse_structured(Simulado, response)
+    except Exception as e:
+        print(f"[BANK] Top-up failed for {exam_type}:{tema!r}: {e}")
+        return
+    added = await asyncio.to_thread(question_bank.add, exam_type, tema, simulado.questions)
+    print(f"[BANK] +{added} questions for {exam_type}:{theme_key(tema)}")
+
+def bank_unseen(exam_type: str, tema: str, questions: List[str], limit: int,
+                seen: Optional[DedupeIndex] = None) -> List[Question]:
+    # Roda numa thread: parse de até SAMPLE_POOL questões do banco + SimHash de cada uma
+    if seen is None:
+        seen = DedupeIndex()
+        for existing in questions or []:
+            seen.add(existing)
+    return question_bank.unseen(exam_type, tema, seen, limit)
+
+def schedule_bank_top_up(exam_type: str, tema: str, model_name: str):
+    # Uma reposição por tema de cada vez, em segundo plano
+    key = (exam_type, theme_key(tema))
+    if key in bank_top_ups:
+        return
+    # Contexto vazio: a reposição não herda o trace da requisição que já terminou
+    task = bank_top_ups[key] = asyncio.create_task(top_up_bank(exam_type, tema, model_name),
+                                                   context=contextvars.Context())
+    task.add_done_callback(lambda _: bank_top_ups.pop(key, None))
 
 app = FastAPI(lifespan=lifespan)
+# Cancela a geração (e o stream com o Ollama) quando o cliente desconecta
+app.add_middleware(DisconnectMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+
+# Templates compilados uma única vez, chaveados por (endpoint, exam_type, lite_rag, has_existing_items)
+prompt_registry = build_registry()
 
-BASE_URL = "http://localhost:11434"
+# Índice de quase-duplicatas por sessão/tema (substitui a lista de itens existentes no prompt)
+dedupe_indexes = DedupeStore()
+MAX_DEDUPE_ATTEMPTS = 3
+
+BASE_URL = OLLAMA_BASE_URL
 BASEDIR_STORAGE = "./storage"
 
+# Cliente assíncrono para /api/tags, /api/version e /api/delete (não bloqueia o event loop)
+ollama_admin = OllamaAdmin(BASE_URL)
+pull_manager = PullManager(ollama_admin)
+
+# `model_name: "auto"` escolhe o modelo por fila, tokens/s medidos e SLA do endpoint
+model_router = ModelRouter(ollama_admin)
+
+# Redações: índice em memória + journal sobre database.json, ou SQLite com ESSAY_STORE=sqlite
+essay_store = create_essay_store(DATABASE_PATH)
+# Busca textual (FTS5 + BM25) sobre redação e feedback, atualizada a cada escrita
+essay_search = EssaySearchIndex(os.path.join(STORAGE_DIR, "essay_search.sqlite3"))
+
+# Redações já corrigidas por SimHash (modelo + exam_type): reenvios levemente editados reaproveitam a correção
+graded_essays = GradedEssayCache(os.path.join(STORAGE_DIR, "graded_essays.sqlite3"))
+
+# Banco de questões geradas e validadas, por tema normalizado + exam_type + idioma
+question_bank = QuestionBank(os.path.join(STORAGE_DIR, "question_bank.sqlite3"))
+SIMULADO_SIZE = 5
+bank_top_ups = {}  # (exam_type, tema normalizado) -> task de reposição em andamento
+
+# Próximos flashcards/questões por sessão, gerados enquanto o estudante lê o item atual
+prefetch_buffers = PrefetchStore()
+
+# Fila de jobs para gerações longas (estado em storage/jobs, sobrevive a restarts)
+job_manager = JobManager(os.path.join(STORAGE_DIR, "jobs"))
+JOB_MAX_WAIT = 60.0
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["x-served-model", "x-trace-id", "server-timing"],
 )
 
 @app.get("/")
 async def root():
     return {"Status": "Ok!"}
 
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(telemetry.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/traces")
+async def list_traces(limit: int = 50, path: Optional[str] = None):
+    selected = [t for t in reversed(tracing.traces) if path is None or t.path == path]
+    return [t.to_dict() for t in selected[:limit]]
+
+@app.get("/admin/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    trace = tracing.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace.to_dict(include_profile=True)
+
+@app.get("/admin/question-bank")
+async def question_bank_status():
+    return {**question_bank.stats(), "top_ups": len(bank_top_ups)}
+
+@app.get("/admin/essay-cache")
+async def essay_cache_status():
+    return graded_essays.stats()
+
+@app.get("/admin/router")
+async def router_status():
+    return model_router.snapshot()
+
 @app.get("/status-ollama")
 async def check_status_ollama():
     try:
-        response = requests.get(f"{BASE_URL}/api/version")
-        if response.status_code == 200:
-            version_ollama = response.json().get('version', 'unknown')
-            print(f"Ollama version: {version_ollama}")
-            return {"status": "Ollama is running", "version": version_ollama}
-        else:
-            return {"status": "Ollama is not running", "version": "unknown"}
-    except requests.exceptions.RequestException as e:
+        version_ollama = (await ollama_admin.version()).get('version', 'unknown')
+        return {"status": "Ollama is running", "version": version_ollama}
+    except httpx.HTTPStatusError:
+        return {"status": "Ollama is not running", "version": "unknown"}
+    except httpx.HTTPError as e:
         return {"status": "Ollama is not running", "error": str(e)}
 
 @app.get("/list-models")
 async def list_models():
-    return get_models_info()
+    return await ollama_admin.tags()
 
 @app.post("/check-model/{model_name}")
 async def check_model(model_name: str):
-    my_local_models = get_models_info()
-    list_model_name = [x['model'] for x in my_local_models['models']]
-    if model_name in list_model_name:
-        return {
-            "model": model_name,
-            "available": True,
-            
-        }
     return {
         "model": model_name,
-        "available": False,
+        "available": await ollama_admin.has_model(model_name),
     }
 
 @app.delete("/delete-model/{model_name}")
 async def delete_model_endpoint(model_name: str):
-    return delete_model(model_name)
+    return await ollama_admin.delete(model_name)
 
 @app.post("/pull-model/{model_name}")
 async def pull_model(model_name: str):
-    def stream_model_pull():
-        url = f"{BASE_URL}/api/pull"
-        payload = {"model": model_name}
-        headers = {"Content-Type": "application/json"}
+    # Um único pull por modelo; clientes simultâneos recebem o mesmo progresso
+    return StreamingResponse(pull_manager.subscribe(model_name), media_type="text/plain")
 
-        with requests.post(url, json=payload, headers=headers, stream=True) as r:
-            for line in r.iter_lines():
-                if line:
-                    # Retorna cada linha do JSON como texto
-                    yield line.decode("utf-8") + "\n"
+@app.get("/pull-model/{model_name}")
+async def resume_pull_model(model_name: str):
+    if not pull_manager.in_progress(model_name):
+        raise HTTPException(status_code=404, detail="No pull in progress for this model")
+    return StreamingResponse(pull_manager.subscribe(model_name, start=False), media_type="text/plain")
 
-    return StreamingResponse(stream_model_pull(), media_type="text/plain")
+@app.get("/pulls")
+async def list_pulls():
+    return [job.to_dict() for job in pull_manager.jobs.values()]
 
 # Enem
 @app.post("/call-model-competencia")
 async def call_model_competencia(input_data: InputDataEssayEnem):
     essay = input_data.essay
-    model_name = input_data.model_name
+    model_name = await model_router.resolve("call-model-competencia", input_data.model_name)
     competencia = input_data.competencia
 
-    llm = ChatOllama(model=model_name, 
-                    temperature=0.0)
-                    #  num_gpu=1)
-
     if competencia not in [1, 2, 3, 4, 5]:
         raise HTTPException(status_code=400, detail="Competência inválida. Deve ser um número entre 1 e 5.")
-        
-    values = [prompt_competencia_1, prompt_competencia_2, prompt_competencia_3, prompt_competencia_4, prompt_competencia_5]
-
-    system_prompt = values[competencia - 1]
 
-    prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_prompt), 
-                ("human", "Redação do usuário: \n\n {essay}")
-            ]
-    )
-    
-    chain = prompt | llm | StrOutputParser()
-
-    response = await chain.ainvoke({"essay": essay})
+    with tracing.span("prompt"):
+        prompt = prompt_registry.get(f"call-model-competencia/{competencia}", "enem")
+        rejected = check_essay(essay, "enem", prompt.messages[0].prompt.template)
+        if rejected is not None:
+            telemetry.essays_rejected.inc(endpoint="call-model-competencia", reason=rejected)
+            tracing.set_attribute("rejected", rejected)
+            return OutputDataEssayEnem(response=zero_score_response(rejected, COMPETENCIA_RUBRIC, "enem"),
+                                       model=model_name, competencia=competencia, rejected=rejected)
+        num_ctx = num_ctx_for(prompt_tokens(prompt, {"essay": essay}), model_name)
+
+    # Mesmo índice do /call-essay, com um escopo por competência
+    scope = f"enem/competencia-{competencia}"
+    fingerprint = None
+    if not input_data.fresh and not input_data.cascade:
+        with tracing.span("dedupe"):
+            fingerprint = await asyncio.to_thread(simhash, essay)
+            previous = await asyncio.to_thread(graded_essays.lookup, model_name, scope, fingerprint)
+        if previous is not None:
+            telemetry.essay_cache_requests.inc(endpoint="call-model-competencia", source="cache")
+            tracing.set_attribute("source", "cache")
+            duplicate = DuplicateInfo(distance=previous["distance"], graded_at=previous["graded_at"])
+            return OutputDataEssayEnem(**previous["result"], duplicate=duplicate)
+    telemetry.essay_cache_requests.inc(endpoint="call-model-competencia", source="live")
+
+    output = await grade_competencia(prompt, essay, model_name, competencia, num_ctx, input_data.cascade)
+    # Correção aceita do modelo pequeno do cascade não substitui a do modelo pedido
+    if output.cascade is None or output.cascade.escalated:
+        if fingerprint is None:
+            fingerprint = await asyncio.to_thread(simhash, essay)
+        await asyncio.to_thread(graded_essays.add, output.model, scope, fingerprint,
+                                output.model_dump(exclude_none=True))
+    return output
+
+
+async def grade_competencia(prompt, essay: str, model_name: str, competencia: int, num_ctx,
+                            cascade: bool) -> OutputDataEssayEnem:
+    if num_ctx is None:
+        # Redação maior que o contexto do modelo: avaliação em trechos (map-reduce)
+        reduce_prompt = prompt_registry.get(f"call-model-competencia/{competencia}/reduce", "enem")
+        response = await map_reduce_grade(prompt, reduce_prompt, essay, model_name, "call-model-competencia", "enem",
+                                          busy=model_router.busy, temperature=0.0)
+        return OutputDataEssayEnem(response=response, model=model_name, competencia=competencia)
+
+    if cascade and model_name != CASCADE_SMALL_MODEL:
+        response, served_model, reason = await cascade_grade(prompt, {"essay": essay}, COMPETENCIA_RUBRIC, model_name,
+                                                             "call-model-competencia", "enem", busy=model_router.busy,
+                                                             num_ctx=num_ctx)
+        tracing.set_attribute("model", served_model)
+        return OutputDataEssayEnem(response=response, model=served_model, competencia=competencia,
+                                   cascade=CascadeInfo(first_pass_model=CASCADE_SMALL_MODEL,
+                                                       escalated=reason is not None, reason=reason))
+
+    chain = prompt | get_llm(model_name, temperature=0.0, num_ctx=num_ctx) | output_parser
+    with tracing.span("generate"), model_router.busy(model_name):
+        response = await chain.ainvoke({"essay": essay}, config=telemetry.track("call-model-competencia", "enem"))
     
     output = {"response": response,
             "model": model_name,
@@ -239,395 +395,430 @@ async def call_model_competencia(input_data: InputDataEssayEnem):
 @app.post("/call-simulado")
 async def call_simulado(input_simulado: InputSimulado):
     tema = input_simulado.tema
-    model_name = input_simulado.model_name
-    lite_rag = input_simulado.lite_rag
+    model_name = await model_router.resolve("call-simulado", input_simulado.model_name)
+    lite_rag = input_simulado.lite_rag and retrieve_enem is not None
     exam_type = input_simulado.exam_type.strip().lower()
     
     if exam_type not in ['enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais',
                          'gaokao', 'ielts']:
         raise HTTPException(status_code=400, detail="Invalid exam type. Must be one of: 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais', 'gaokao', 'ielts'.")
 
-    language = {
-        "enem": "portuguese",
-        "icfes": "spanish",
-        "exani": "spanish",
-        "sat": "english",
-        "cuet": "english",
-        "exames_nacionais": "portuguese",
-        "gaokao": "chinese",
-        "ielts": "english"
-    }
-    
-    template = [
-        ('system', f"""You will generate questions to compose an {exam_type} practice test."""),
-        ('system', f"""The language of the exam is {language[exam_type]}."""),
-        ('system', "Don't create purely objective questions like 'What is?', 'Who was?', briefly contextualize the theme and create questions that require reasoning."),
-        ('system', """Follow the structure:
-            [
-                {{
-                "question": "string",
-                "A": "string",
-                "B": "string",
-                "C": "string",
-                "D": "string",
-                "E": "string",
-                "correct_answer": "A|B|C|D|E",
-                "explanation": "string"
-                }},
-                {{
-                "question": "string",
-                "A": "string",
-                "B": "string",
-                "C": "string",
-                "D": "string",
-                "E": "string",
-                "correct_answer": "A|B|C|D|E",
-                "explanation": "string"
-                }},
-                ...
-            ]
-        """),
-        ('system', "Generate 5 questions about the theme: {tema}"),
-    ]
-    
+    if not input_simulado.fresh:
+        with tracing.span("bank"):
+            banked = await asyncio.to_thread(bank_unseen, exam_type, tema, input_simulado.questions,
+                                             SIMULADO_SIZE + QUESTION_BANK_MIN_UNSEEN)
+        if len(banked) >= SIMULADO_SIZE:
+            if len(banked) < SIMULADO_SIZE + QUESTION_BANK_MIN_UNSEEN:
+                schedule_bank_top_up(exam_type, tema, model_name)
+            telemetry.question_bank_requests.inc(endpoint="call-simulado", source="bank")
+            tracing.set_attribute("source", "bank")
+            questions = banked[:SIMULADO_SIZE]
+            if input_simulado.stream:
+                return StreamingResponse((q.model_dump_json() + "\n" for q in questions),
+                                         media_type="application/x-ndjson")
+            return json.dumps([q.model_dump() for q in questions], ensure_ascii=False)
+    telemetry.question_bank_requests.inc(endpoint="call-simulado", source="live")
+
+    inputs = {"tema": tema}
     if lite_rag:
-        chain_translate = (
-            ChatPromptTemplate.from_messages([
-                ('system', "Traduza para o português (se possível, escreva 1 frase que descreva o tema): {tema}"),
-            ])
-            | ChatOllama(model="gemma3n:e2b", temperature=0.6, seed=random.randint(0, 1000))
-            | StrOutputParser()
-        )
-        tema_translated = await chain_translate.ainvoke({"tema": tema})
-        print(f"Translated theme: {tema_translated}")
-        retrieved_content = random.choice(retrieve_enem.query(tema_translated, k=4)).content
-        print(f"Retrieved content: {retrieved_content}")
-        template.append(('system', f"""Use the following content to support the questions (if the content is not relevant, ignore it):\n""" + retrieved_content))
-
-    prompt = ChatPromptTemplate.from_messages(template)
-
-    llm = ChatOllama(model=model_name,
-                     temperature=0.0)
-
-    chain_simulado = (
-        prompt
-        | llm
-        | StrOutputParser()
-    )
-
-    response = await chain_simulado.ainvoke({"tema": tema})
-    return response
+        inputs["context"] = await retrieve_context(tema, "call-simulado", exam_type)
+
+    with tracing.span("prompt"):
+        prompt = prompt_registry.get("call-simulado", exam_type, lite_rag)
+        chain_simulado = prompt | get_llm(model_name, Simulado, temperature=0.0) | output_parser
+
+    if input_simulado.stream:
+        # Cada questão é enviada assim que o objeto JSON fecha
+        async def stream_questions():
+            parser = JsonArrayStreamParser()
+            with tracing.span("generate"), model_router.busy(model_name):
+                async for chunk in chain_simulado.astream(inputs, config=telemetry.track("call-simulado", exam_type)):
+                    for item in parser.feed(chunk):
+                        try:
+                            question = Question.model_validate(item)
+                        except ValidationError:
+                            continue
+                        await asyncio.to_thread(question_bank.add, exam_type, tema, [question])
+                        yield question.model_dump_json() + "\n"
+
+        return StreamingResponse(stream_questions(), media_type="application/x-ndjson")
+
+    with tracing.span("generate"), model_router.busy(model_name):
+        response = await chain_simulado.ainvoke(inputs, config=telemetry.track("call-simulado", exam_type))
+    simulado = parse_structured(Simulado, response)
+    await asyncio.to_thread(question_bank.add, exam_type, tema, simulado.questions)
+    return json.dumps([question.model_dump() for question in simulado.questions], ensure_ascii=False)
 
 @app.post("/call-simulado-questao")
-async def call_simulado(input_simulado: InputSimulado):
+async def call_simulado_questao(input_simulado: InputSimulado):
     tema = input_simulado.tema
-    model_name = input_simulado.model_name
-    lite_rag = input_simulado.lite_rag
+    model_name = await model_router.resolve("call-simulado-questao", input_simulado.model_name)
+    lite_rag = input_simulado.lite_rag and retrieve_enem is not None
     exam_type = input_simulado.exam_type.strip().lower()
     questions = input_simulado.questions
 
     if exam_type not in ['enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais',
                          'gaokao', 'ielts']:
         raise HTTPException(status_code=400, detail="Invalid exam type. Must be one of: 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais', 'gaokao', 'ielts'.")
-    
-    language = {
-        "enem": "portuguese-Brasil",
-        "icfes": "spanish",
-        "exani": "spanish",
-        "sat": "english",
-        "cuet": "english",
-        "exames_nacionais": "portuguese-Portugal",
-        "gaokao": "chinese",
-        "ielts": "english"
-    }
-    
-    template = [
-        ('system', f"""You will generate questions to compose an {exam_type} practice test."""),
-        ('system', f"""The language of the exam is {language[exam_type]}."""),
-        ('system', "Don't create purely objective questions like 'What is?', 'Who was?', create questions that require reasoning."),
-        ('system', """Follow the structure:
-            {{
-                "question": "string",
-                "A": "string",
-                "B": "string",
-                "C": "string",
-                "D": "string",
-                "E": "string",
-                "correct_answer": "A|B|C|D|E",
-                "explanation": "string"
-                }}
-        """),
-        ('system', "Do not repeat existing questions. Consider that there is already one (or more) question(s) with this/these content: {questions}."),
-        ('system', """Generate only one question about the theme: {tema}\n"""),
-    ]
-    
-    if lite_rag:
-        chain_translate = (
-            ChatPromptTemplate.from_messages([
-                ('system', "Traduza para o português (se possível, escreva 1 frase que descreva o tema): {tema}"),
-            ])
-            | ChatOllama(model="gemma3n:e2b", temperature=0.6, seed=random.randint(0, 1000))
-            | StrOutputParser()
-        )
-        tema_translated = await chain_translate.ainvoke({"tema": tema})
-        print(f"Translated theme: {tema_translated}")
-        retrieved_content = random.choice(retrieve_enem.query(tema_translated, k=4)).content
-        print(f"Retrieved content: {retrieved_content}")
-        template.append(('system', f"""Use the following content to support the question (if the content is not relevant, ignore it):\n""" + retrieved_content))
-
-    prompt = ChatPromptTemplate.from_messages(template)
-
-    # Sortear um inteiro de 0 a 1000 para o seed e um float de 0 a 1 para a temperatura
-    seed = random.randint(0, 1000)
-    temperature = round(random.uniform(0, 1), 2)
-    llm = ChatOllama(model=model_name, temperature=temperature, seed=seed)
 
-    chain_simulado = (
-        prompt
-        | llm
-        | StrOutputParser()
-    )
-
-    response = await chain_simulado.ainvoke({"tema": tema, "questions": "\n--\n".join(questions)})
-    return {"response": response, "temperature": temperature, "seed": seed}
+    index = dedupe_indexes.get(DedupeStore.key(input_simulado.session_id, exam_type, tema))
+    for existing in questions:
+        index.add(existing)
+
+    if not input_simulado.fresh:
+        with tracing.span("bank"):
+            # Com sessão, o índice da sessão; sem ela, só o que este cliente enviou em `questions`
+            banked = await asyncio.to_thread(bank_unseen, exam_type, tema, questions, 1 + QUESTION_BANK_MIN_UNSEEN,
+                                             index if input_simulado.session_id else None)
+        if banked:
+            if len(banked) <= QUESTION_BANK_MIN_UNSEEN:
+                schedule_bank_top_up(exam_type, tema, model_name)
+            telemetry.question_bank_requests.inc(endpoint="call-simulado-questao", source="bank")
+            tracing.set_attribute("source", "bank")
+            if input_simulado.session_id:
+                index.add(banked[0].question)
+            return {"response": banked[0].model_dump_json(), "temperature": None, "seed": None, "source": "bank"}
+        if not input_simulado.session_id:
+            # Com sessão, o prefetch já gera os próximos itens (e os guarda no banco)
+            schedule_bank_top_up(exam_type, tema, model_name)
+
+    session_id = input_simulado.session_id
+    # Modelo pedido, não o resolvido: com "auto" o roteador pode trocar de modelo entre requests da mesma sessão
+    signature = (exam_type, theme_key(tema), input_simulado.model_name, lite_rag)
+    context = None
+
+    async def generate(chain="generate"):
+        nonlocal context
+        if lite_rag and context is None:
+            context = await retrieve_context(tema, "call-simulado-questao", exam_type)
+        covered = index.summary()
+        inputs = {"tema": tema, "covered": covered}
+        if context is not None:
+            inputs["context"] = context
+
+        with tracing.span("prompt"):
+            prompt = prompt_registry.get("call-simulado-questao", exam_type, lite_rag, bool(covered))
+
+        for attempt in range(MAX_DEDUPE_ATTEMPTS):
+            # Sortear um inteiro de 0 a 1000 para o seed e um float de 0 a 1 para a temperatura
+            seed = random.randint(0, 1000)
+            temperature = round(random.uniform(0, 1), 2)
+            chain_simulado = prompt | get_llm(model_name, Question, temperature=temperature, seed=seed) | output_parser
+
+            with tracing.span("generate"), model_router.busy(model_name):
+                response = await chain_simulado.ainvoke(inputs, config=telemetry.track("call-simulado-questao", exam_type, chain))
+            question = parse_structured(Question, response)
+            if not index.is_duplicate(question.question):
+                break
+            print(f"[DEDUPE] Near-duplicate question, regenerating ({attempt + 1}/{MAX_DEDUPE_ATTEMPTS})")
+        index.add(question.question)
+        await asyncio.to_thread(question_bank.add, exam_type, tema, [question])
+        return {"response": question.model_dump_json(), "temperature": temperature, "seed": seed}
+
+    if session_id:
+        prefetched = await prefetch_buffers.take(session_id, "call-simulado-questao", signature)
+        if prefetched is not None:
+            tracing.set_attribute("source", "prefetch")
+            prefetch_buffers.refill(session_id, "call-simulado-questao", signature, lambda: generate("prefetch"))
+            return {**prefetched, "source": "prefetch"}
+
+    telemetry.question_bank_requests.inc(endpoint="call-simulado-questao", source="live")
+    result = await generate()
+    if session_id:
+        # Gera os próximos itens enquanto o estudante lê este
+        prefetch_buffers.refill(session_id, "call-simulado-questao", signature, lambda: generate("prefetch"))
+    return {**result, "source": "live"}
 
 @app.post("/call-flashcard")
 async def call_flashcard(input_flashcard: InputFlashcard):
     tema = input_flashcard.tema
-    model_name = input_flashcard.model_name
+    model_name = await model_router.resolve("call-flashcard", input_flashcard.model_name)
     flashcards_existentes = input_flashcard.flashcards_existentes
     exam_type = input_flashcard.exam_type
-    lite_rag = input_flashcard.lite_rag
-    
-    print(input_flashcard.flashcards_existentes)
-    
+    lite_rag = input_flashcard.lite_rag and retrieve_enem is not None
+
     if exam_type not in ['enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais',
                          'gaokao', 'ielts']:
         raise HTTPException(status_code=400, detail="Invalid exam type. Must be one of: 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais', 'gaokao', 'ielts'.")
-    
-    language = {
-        "enem": "portuguese-Brasil",
-        "icfes": "spanish",
-        "exani": "spanish",
-        "sat": "english",
-        "cuet": "english",
-        "exames_nacionais": "portuguese-Portugal",
-        "gaokao": "chinese",
-        "ielts": "english"
-    }
-
-    if len(flashcards_existentes) == 0:
-        template = [
-            ('system', """You will generate an educational flashcard for studying."""),
-            ('system', f"""The language of the exam is {language[exam_type]}."""),
-            ('system', f"""Consider that the flashcard should be relevant for the {exam_type} exam."""),
-            ('system', """Create the flashcard in question-answer format."""),
-            ('system', """Follow EXACTLY this JSON structure:
-                {{
-                    "question": "Question about the concept...",
-                    "answer": "Clear and didactic answer..."
-                }}
-            """),
-            ('system', "Generate a flashcard about the theme: {tema}"),
-            ('system', "The question should test essential knowledge and the answer should be complete."),
-        ]
-    else:
-        template = [
-            ('system', """You will generate an educational flashcard for studying."""),
-            ('system', f"""The language of the exam is {language[exam_type]}."""),
-            ('system', f"""Consider that the flashcard should be relevant for the {exam_type} exam."""),
-            ('system', """Create the flashcard in question-answer format."""),
-            ('system', """Follow EXACTLY this JSON structure:
-                {{
-                    "question": "Question about the concept...",
-                    "answer": "Clear and didactic answer..."
-                }}
-            """),
-            ('system', "Generate a flashcard about the theme: {tema}"),
-            ('system', "Do not repeat existing questions. Consider that there is already one (or more) flashcard(s) with this/these question(s): {flashcards_existentes}."),
-            ('system', "The question should test essential knowledge and the answer should be complete."),
-        ]
-
-    if lite_rag:
-        chain_translate = (
-            ChatPromptTemplate.from_messages([
-                ('system', "Traduza para o português (se possível, escreva 1 frase que descreva o tema): {tema}"),
-            ])
-            | ChatOllama(model="gemma3n:e2b", temperature=0.6, seed=random.randint(0, 1000))
-            | StrOutputParser()
-        )
-        tema_translated = await chain_translate.ainvoke({"tema": tema})
-        print(f"Translated theme: {tema_translated}")
-        retrieved_content = random.choice(retrieve_enem.query(tema_translated, k=4)).content
-        print(f"Retrieved content: {retrieved_content}")
-        template.insert(6, ('system', f"""Use the following content to support the question (if the content is not relevant, ignore it):\n""" + retrieved_content))
 
-    prompt = ChatPromptTemplate.from_messages(template)
-
-    # Aleatoriedade para o seed e temperatura
-    seed = random.randint(0, 1000)
-    temperature = round(random.uniform(0, 1), 2)
-    llm = ChatOllama(model=model_name, temperature=temperature, seed=seed)
-
-    chain_flashcard = (
-        prompt
-        | llm
-        | StrOutputParser()
-    )
-
-    response = await chain_flashcard.ainvoke({"tema": tema, "flashcards_existentes": "\n--\n".join(flashcards_existentes)})
+    index = dedupe_indexes.get(DedupeStore.key(input_flashcard.session_id, exam_type, tema))
+    for existing in flashcards_existentes:
+        index.add(existing)
+
+    session_id = input_flashcard.session_id
+    # Modelo pedido, não o resolvido: com "auto" o roteador pode trocar de modelo entre requests da mesma sessão
+    signature = (exam_type, theme_key(tema), input_flashcard.model_name, lite_rag)
+    context = None
+
+    async def generate(chain="generate"):
+        nonlocal context
+        if lite_rag and context is None:
+            context = await retrieve_context(tema, "call-flashcard", exam_type)
+        covered = index.summary()
+        inputs = {"tema": tema, "covered": covered}
+        if context is not None:
+            inputs["context"] = context
+
+        with tracing.span("prompt"):
+            prompt = prompt_registry.get("call-flashcard", exam_type, lite_rag, bool(covered))
+
+        for attempt in range(MAX_DEDUPE_ATTEMPTS):
+            # Aleatoriedade para o seed e temperatura
+            seed = random.randint(0, 1000)
+            temperature = round(random.uniform(0, 1), 2)
+            chain_flashcard = prompt | get_llm(model_name, Flashcard, temperature=temperature, seed=seed) | output_parser
+
+            with tracing.span("generate"), model_router.busy(model_name):
+                response = await chain_flashcard.ainvoke(inputs, config=telemetry.track("call-flashcard", exam_type, chain))
+            flashcard = parse_structured(Flashcard, response)
+            if not index.is_duplicate(flashcard.question):
+                break
+            print(f"[DEDUPE] Near-duplicate flashcard, regenerating ({attempt + 1}/{MAX_DEDUPE_ATTEMPTS})")
+        index.add(flashcard.question)
+        return flashcard.model_dump_json()
+
+    if session_id:
+        prefetched = await prefetch_buffers.take(session_id, "call-flashcard", signature)
+        if prefetched is not None:
+            tracing.set_attribute("source", "prefetch")
+            prefetch_buffers.refill(session_id, "call-flashcard", signature, lambda: generate("prefetch"))
+            return prefetched
+
+    response = await generate()
+    if session_id:
+        # Gera os próximos itens enquanto o estudante lê este
+        prefetch_buffers.refill(session_id, "call-flashcard", signature, lambda: generate("prefetch"))
     return response
 
 @app.post("/call-key-topics")
 async def call_key_topics(input_data_key_topics: InputDataKeyTopics):
     tema = input_data_key_topics.tema
-    model_name = input_data_key_topics.model_name
+    model_name = await model_router.resolve("call-key-topics", input_data_key_topics.model_name)
     exam_type = input_data_key_topics.exam_type
-    lite_rag = input_data_key_topics.lite_rag
+    lite_rag = input_data_key_topics.lite_rag and retrieve_enem is not None
     
     if exam_type not in ['enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais',
                          'gaokao', 'ielts']:
         raise HTTPException(status_code=400, detail="Invalid exam type. Must be one of: 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais', 'gaokao', 'ielts'.")
-    
-    language = {
-        "enem": "portuguese-Brasil",
-        "icfes": "spanish",
-        "exani": "spanish",
-        "sat": "english",
-        "cuet": "english",
-        "exames_nacionais": "portuguese-Portugal",
-        "gaokao": "chinese",
-        "ielts": "english"
-    }
-
-    template = [
-        ('system', """You will generate key topics about an educational theme."""),
-        ('system', f"""The language of the exam is {language[exam_type]}."""),
-        ('system', f"""Consider that the key topics should be relevant for the {exam_type} exam."""),
-        ('system', """Create a general explanation of the theme and list the 3 most important key points."""),
-        ('system', """Follow EXACTLY this JSON structure:
-            {{
-                "explanation": "A comprehensive and didactic explanation of the theme...",
-                "key_topics": [
-                    "First most important key point...",
-                    "Second most important key point...",
-                    "Third most important key point..."
-                ]
-            }}
-        """),
-        ('system', "Analyze the theme: {tema}"),
-        ('system', "The general explanation should be complete but accessible, and the 3 key topics should cover the most fundamental aspects."),
-    ]
 
+    inputs = {"tema": tema}
     if lite_rag:
-        chain_translate = (
-            ChatPromptTemplate.from_messages([
-                ('system', "Traduza para o português (se possível, escreva 1 frase que descreva o tema): {tema}"),
-            ])
-            | ChatOllama(model="gemma3n:e2b", temperature=0.6, seed=random.randint(0, 1000))
-            | StrOutputParser()
-        )
-        tema_translated = await chain_translate.ainvoke({"tema": tema})
-        print(f"Translated theme: {tema_translated}")
-        retrieved_content = random.choice(retrieve_enem.query(tema_translated, k=4)).content
-        print(f"Retrieved content: {retrieved_content}")
-        template.insert(6, ('system', f"""Use the following content to support the explanation (if the content is not relevant, ignore it):\n""" + retrieved_content))
-
-    prompt = ChatPromptTemplate.from_messages(template)
+        inputs["context"] = await retrieve_context(tema, "call-key-topics", exam_type)
 
     # Aleatoriedade para temperatura e seed
     seed = random.randint(0, 1000)
     temperature = round(random.uniform(0, 1), 2)
-    llm = ChatOllama(model=model_name, temperature=temperature, seed=seed)
 
-    chain_key_topics = (
-        prompt
-        | llm
-        | StrOutputParser()
-    )
+    with tracing.span("prompt"):
+        prompt = prompt_registry.get("call-key-topics", exam_type, lite_rag)
+        chain_key_topics = prompt | get_llm(model_name, KeyTopics, temperature=temperature, seed=seed) | output_parser
 
-    response = await chain_key_topics.ainvoke({"tema": tema})
-    return response
+    with tracing.span("generate"), model_router.busy(model_name):
+        response = await chain_key_topics.ainvoke(inputs, config=telemetry.track("call-key-topics", exam_type))
+    return parse_structured(KeyTopics, response).model_dump_json()
 
 
 @app.post("/call-essay")
 async def call_essay(input_data: InputDataEssay):
     essay = input_data.essay
-    model_name = input_data.model_name
+    model_name = await model_router.resolve("call-essay", input_data.model_name)
     exam_type = input_data.exam_type.strip().lower()
     
-    llm = ChatOllama(model=model_name, temperature=0.0)
     if exam_type not in ['enem', 'sat','exames_nacionais', 'gaokao', 'ielts',
                          'icfes', 'cuet', 'exani']:
         raise HTTPException(status_code=400, detail="Invalid exam type. Must be one of: 'enem', 'sat', 'exames_nacionais', 'gaokao', 'ielts', 'icfes', 'cuet', 'exani'.")
     
-    system_prompt = exams_types[exam_type]
-    promt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            ("human", "Redação do usuário: {essay}")
-        ]
-    )
-    chain  = promt | llm | StrOutputParser()
-    response = await chain.ainvoke({"essay": essay})
+    with tracing.span("prompt"):
+        prompt = prompt_registry.get("call-essay", exam_type)
+        rejected = check_essay(essay, exam_type, prompt.messages[0].prompt.template)
+        if rejected is not None:
+            telemetry.essays_rejected.inc(endpoint="call-essay", reason=rejected)
+            tracing.set_attribute("rejected", rejected)
+            response = zero_score_response(rejected, ESSAY_RUBRICS.get(exam_type), exam_type)
+            return {"response": response, "model": model_name, "exam_type": exam_type, "rejected": rejected}
+        num_ctx = num_ctx_for(prompt_tokens(prompt, {"essay": essay}), model_name)
+
+    # Chave = modelo que corrigiu. Em modo cascade o modelo só é conhecido depois, então não há consulta
+    fingerprint = None
+    if not input_data.fresh and not input_data.cascade:
+        with tracing.span("dedupe"):
+            fingerprint = await asyncio.to_thread(simhash, essay)
+            previous = await asyncio.to_thread(graded_essays.lookup, model_name, exam_type, fingerprint)
+        if previous is not None:
+            telemetry.essay_cache_requests.inc(endpoint="call-essay", source="cache")
+            tracing.set_attribute("source", "cache")
+            duplicate = DuplicateInfo(distance=previous["distance"], graded_at=previous["graded_at"])
+            return {**previous["result"], "duplicate": duplicate.model_dump()}
+    telemetry.essay_cache_requests.inc(endpoint="call-essay", source="live")
+
+    result = await grade_essay(prompt, essay, model_name, exam_type, num_ctx, input_data.cascade)
+    # Correção aceita do modelo pequeno do cascade não substitui a do modelo pedido
+    if not (result.get("cascade") and not result["cascade"]["escalated"]):
+        if fingerprint is None:
+            fingerprint = await asyncio.to_thread(simhash, essay)
+        await asyncio.to_thread(graded_essays.add, result["model"], exam_type, fingerprint, result)
+    return result
+
+
+async def grade_essay(prompt, essay: str, model_name: str, exam_type: str, num_ctx, cascade: bool) -> dict:
+    if num_ctx is None:
+        # Redação maior que o contexto do modelo: avaliação em trechos (map-reduce)
+        response = await map_reduce_grade(prompt, prompt_registry.get("call-essay/reduce", exam_type), essay,
+                                          model_name, "call-essay", exam_type, busy=model_router.busy, temperature=0.0)
+        return {"response": response, "model": model_name, "exam_type": exam_type}
+
+    rubric = ESSAY_RUBRICS.get(exam_type)
+    if cascade and rubric is not None and model_name != CASCADE_SMALL_MODEL:
+        response, served_model, reason = await cascade_grade(prompt, {"essay": essay}, rubric, model_name,
+                                                             "call-essay", exam_type, busy=model_router.busy,
+                                                             num_ctx=num_ctx)
+        tracing.set_attribute("model", served_model)
+        cascade_info = CascadeInfo(first_pass_model=CASCADE_SMALL_MODEL, escalated=reason is not None, reason=reason)
+        return {"response": response, "model": served_model, "exam_type": exam_type,
+                "cascade": cascade_info.model_dump()}
+
+    chain = prompt | get_llm(model_name, temperature=0.0, num_ctx=num_ctx) | output_parser
+    with tracing.span("generate"), model_router.busy(model_name):
+        response = await chain.ainvoke({"essay": essay}, config=telemetry.track("call-essay", exam_type))
     
     return {"response": response, "model": model_name, "exam_type": exam_type}
 
+# Jobs
+JOB_KINDS = {
+    "simulado": (InputSimulado, lambda data: call_simulado(data.model_copy(update={"stream": False}))),
+    "simulado-questao": (InputSimulado, call_simulado_questao),
+    "flashcard": (InputFlashcard, call_flashcard),
+    "key-topics": (InputDataKeyTopics, call_key_topics),
+    "essay": (InputDataEssay, call_essay),
+    "competencia": (InputDataEssayEnem, call_model_competencia),
+}
+
+def register_job_kind(kind, input_model, handler):
+    async def run(payload: dict):
+        return await handler(input_model.model_validate(payload))
+    job_manager.register(kind, run)
+
+for kind, (input_model, handler) in JOB_KINDS.items():
+    register_job_kind(kind, input_model, handler)
+
+@app.post("/jobs/{kind}", status_code=202)
+async def submit_job(kind: str, payload: dict = Body(...), run_after: Optional[float] = None):
+    # run_after (epoch em segundos) permite agendar lotes para horários de menor uso
+    if kind not in JOB_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind. Must be one of: {', '.join(JOB_KINDS)}.")
+    input_model, _ = JOB_KINDS[kind]
+    try:
+        data = input_model.model_validate(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    job = await job_manager.submit(kind, data.model_dump(), run_after=run_after)
+    return {"job_id": job.job_id, "status": job.status}
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 50, status: Optional[str] = None):
+    selected = [j for j in sorted(job_manager.jobs.values(), key=lambda j: j.created_at, reverse=True)
+                if status is None or j.status == status]
+    return [j.model_dump(exclude={"payload", "result"}) for j in selected[:limit]]
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.model_dump(exclude={"payload"})
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, wait: float = 0.0):
+    # Long-poll: segura a conexão até `wait` segundos ou até o job terminar
+    job = await job_manager.wait(job_id, min(max(wait, 0.0), JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job.finished:
+        return JSONResponse(status_code=202, content={"job_id": job.job_id, "status": job.status})
+    return job.model_dump(exclude={"payload"})
+
 # CRUD 
 
 # Criar item
 @app.post("/essays/", response_model=Essay)
 def create_item(item: InputEssay):
-    data = load_data()
-    item_output = item.dict()
-    item_output['essay_id'] = None
-    item = Essay(**item_output)
-    if not item.essay_id:
-        max_id = max((existing_item["essay_id"] for existing_item in data if existing_item["essay_id"] is not None), default=0)
-        item.essay_id = max_id + 1
-    else:
-        for existing_item in data:
-            if existing_item["essay_id"] == item.essay_id:
-                raise HTTPException(status_code=400, detail="Item with this ID already exists.")
-    data.append(item.dict())
-    save_data(data)
-    return item
+    created = essay_store.create(item.dict())
+    essay_search.index(created)
+    return created
 
-# Listar todos
+# Listar todos (registros do store já validados: serializados direto, sem passar pelo response_model)
 @app.get("/essays/", response_model=List[Essay])
-def read_items():
-    return load_data()
+def read_items(request: Request):
+    return json_response(request, essay_store.list())
+
+# Listar paginado (keyset: mais recentes primeiro, `cursor` = next_cursor da página anterior)
+@app.get("/essays/page", response_model=EssayPage)
+def read_items_page(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None,
+    exam_type: Optional[str] = None,
+    min_grade: Optional[int] = None,
+    max_grade: Optional[int] = None,
+    created_after: Optional[float] = None,
+    created_before: Optional[float] = None,
+):
+    items = essay_store.page(limit, cursor=cursor, exam_type=exam_type, min_grade=min_grade, max_grade=max_grade,
+                             created_after=created_after, created_before=created_before)
+    next_cursor = items[-1]["essay_id"] if len(items) == limit else None
+    return json_response(request, {"items": items, "next_cursor": next_cursor})
+
+# Exportar (NDJSON ou array JSON em streaming, gzip se aceito; memória constante)
+@app.get("/essays/export")
+def export_items(
+    request: Request,
+    format: str = Query("ndjson", pattern=f"^({'|'.join(EXPORT_FORMATS)})$"),
+    exam_type: Optional[str] = None,
+    min_grade: Optional[int] = None,
+    max_grade: Optional[int] = None,
+    created_after: Optional[float] = None,
+    created_before: Optional[float] = None,
+):
+    records = essay_store.iter_items(exam_type=exam_type, min_grade=min_grade, max_grade=max_grade,
+                                     created_after=created_after, created_before=created_before)
+    return stream_records(request, records, format, "essays")
+
+# Busca textual nas redações e feedbacks (ranking BM25, trecho com os termos destacados)
+@app.get("/essays/search")
+def search_items(q: str, exam_type: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    with tracing.span("search"):
+        results = essay_search.search(q, essay_store.get, exam_type=exam_type, limit=limit)
+    return {"query": q, "results": results}
+
+# Estatísticas de notas por exam_type (agregados incrementais: custo independe do histórico)
+@app.get("/essays/analytics")
+def essays_analytics(exam_type: Optional[str] = None, bin_width: Optional[float] = Query(None, gt=0)):
+    return essay_store.grade_stats(exam_type, bin_width)
 
 # Obter item por ID
 @app.get("/essays/{item_id}", response_model=Essay)
-def read_item(item_id: int):
-    data = load_data()
-    for item in data:
-        if item["essay_id"] == item_id:
-            return item
-    raise HTTPException(status_code=404, detail="Item not found")
+def read_item(request: Request, item_id: int):
+    item = essay_store.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return json_response(request, item)
 
 # Atualizar item
 @app.put("/essays/{item_id}", response_model=Essay)
 def update_item(item_id: int, updated_item: Essay):
-    data = load_data()
-    for idx, item in enumerate(data):
-        if item["essay_id"] == item_id:
-            data[idx] = updated_item.dict()
-            save_data(data)
-            return updated_item
-    raise HTTPException(status_code=404, detail="Item not found")
+    item = essay_store.update(item_id, updated_item.dict())
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    essay_search.index(item)
+    return item
 
 # Deletar item
 @app.delete("/essays/{item_id}")
 def delete_item(item_id: int):
-    data = load_data()
-    for idx, item in enumerate(data):
-        if item["essay_id"] == item_id:
-            del data[idx]
-            save_data(data)
-            return {"message": "Item deleted"}
-    raise HTTPException(status_code=404, detail="Item not found")
+    if not essay_store.delete(item_id):
+        raise HTTPException(status_code=404, detail="Item not found")
+    essay_search.remove(item_id)
+    return {"message": "Item deleted"}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
@@ -0,0 +1,93 @@
+import os
+from contextlib import nullcontext
+from typing import Dict, Optional, Tuple, Type, get_args
+
+from ollama import ResponseError
+from pydantic import BaseModel, ValidationError
+
+from . import telemetry, tracing
+from .llm import get_llm, output_parser
+from .schemas import CompetenciaGrade, CompetenciaNota, ExamesNacionaisGrade, GaokaoGrade, IeltsGrade, SatGrade
+
+CASCADE_SMALL_MODEL = os.getenv("CASCADE_SMALL_MODEL", "gemma3:1b")
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", "0.05"))
+
+# Limites entre faixas (fraco/regular/bom/excelente) na nota normalizada 0-1
+ESSAY_BAND_EDGES = (0.4, 0.6, 0.8)
+# Competências do ENEM: só os níveis 0, 40, ..., 200 são notas válidas, então nenhuma nota fica a menos
+# de CASCADE_MARGIN de um limite entre níveis. A fronteira é o par de níveis vizinhos ao limite entre
+# insuficiente (até 80) e suficiente (a partir de 120); escalar em todo limite escalaria todas as notas.
+COMPETENCIA_LEVELS = tuple(level / 200 for level in get_args(CompetenciaNota))
+COMPETENCIA_BAND_EDGES = (0.5,)
+
+
+class Rubric:
+    """Structured grade schema plus the score ranges used to place it in a band."""
+
+    def __init__(self, schema: Type[BaseModel], scores: Dict[str, Tuple[float, float]],
+                 edges: Tuple[float, ...] = ESSAY_BAND_EDGES, levels: Optional[Tuple[float, ...]] = None):
+        self.schema = schema
+        self.scores = scores
+        self.edges = edges
+        # Notas discretas (normalizadas): a fronteira são os níveis logo abaixo e logo acima de cada limite
+        self.boundary_levels = None
+        if levels is not None:
+            self.boundary_levels = set()
+            for edge in self.edges:
+                self.boundary_levels.add(max(level for level in levels if level < edge))
+                self.boundary_levels.add(min(level for level in levels if level > edge))
+
+    def normalized(self, grade: BaseModel) -> float:
+        values = [(getattr(grade, field) - low) / (high - low) for field, (low, high) in self.scores.items()]
+        return sum(values) / len(values)
+
+    def near_boundary(self, grade: BaseModel, margin: float = CASCADE_MARGIN) -> bool:
+        score = self.normalized(grade)
+        if self.boundary_levels is not None:
+            return any(abs(score - level) < 1e-9 for level in self.boundary_levels)
+        return any(abs(score - edge) <= margin for edge in self.edges)
+
+
+COMPETENCIA_RUBRIC = Rubric(CompetenciaGrade, {"nota": (0, 200)}, COMPETENCIA_BAND_EDGES, COMPETENCIA_LEVELS)
+
+# Só exames cuja rubrica pede um JSON com notas; os demais seguem sem cascata
+ESSAY_RUBRICS = {
+    "sat": Rubric(SatGrade, {"reading": (1, 4), "analysis": (1, 4), "writing": (1, 4)}),
+    "exames_nacionais": Rubric(ExamesNacionaisGrade, {"structure_thematic_and_discursive": (0, 20),
+                                                      "linguistic_correction": (0, 20)}),
+    "gaokao": Rubric(GaokaoGrade, {"basic_content": (0, 20), "basic_expression": (0, 20),
+                                   "development_level": (0, 20)}),
+    "ielts": Rubric(IeltsGrade, {"task_achievement_response": (0, 9), "coherence_cohesion": (0, 9),
+                                 "lexical_resource": (0, 9), "grammatical_range_accuracy": (0, 9)}),
+}
+
+
+async def cascade_grade(prompt, inputs: dict, rubric: Rubric, model_name: str, endpoint: str,
+                        exam_type: Optional[str], small_model: str = CASCADE_SMALL_MODEL, busy=None, **options):
+    """
+    Grades with `small_model` first and keeps the answer when it validates
+    against the rubric schema and is not close to a band edge; otherwise
+    grades again with `model_name`. Returns (response, served model, reason),
+    where reason is None when the first pass was kept. `busy(model)` wraps
+    each call (the model router uses it to count in-flight calls).
+    """
+    busy = busy or (lambda model: nullcontext())
+    small_chain = prompt | get_llm(small_model, rubric.schema, temperature=0.0, **options) | output_parser
+    try:
+        with tracing.span("generate-small"), busy(small_model):
+            response = await small_chain.ainvoke(inputs, config=telemetry.track(endpoint, exam_type, "cascade-small"))
+        grade = rubric.schema.model_validate_json(response)
+        reason = "boundary" if rubric.near_boundary(grade) else None
+    except ValidationError:
+        reason = "invalid"
+    except ResponseError:
+        # Modelo pequeno não instalado: segue direto para o modelo maior
+        reason = "unavailable"
+    telemetry.cascade_grades.inc(endpoint=endpoint, outcome=reason or "accepted")
+    if reason is None:
+        return response, small_model, None
+
+    large_chain = prompt | get_llm(model_name, rubric.schema, temperature=0.0, **options) | output_parser
+    with tracing.span("generate"), busy(model_name):
+        response = await large_chain.ainvoke(inputs, config=telemetry.track(endpoint, exam_type, "cascade-large"))
+    return response, model_name, reason
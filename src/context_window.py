@@ -0,0 +1,104 @@
+import asyncio
+import math
+import os
+import re
+from contextlib import nullcontext
+from typing import List, Optional
+
+from . import telemetry, tracing
+from .llm import context_limit, default_num_ctx, get_llm, output_parser
+
+OUTPUT_RESERVE = int(os.getenv("OUTPUT_RESERVE_TOKENS", "1024"))
+MESSAGE_OVERHEAD = 4  # tokens de controle do chat template por mensagem
+
+_CJK_RANGES = "\u3000-\u9fff\uac00-\ud7af"
+_PIECES = re.compile(rf"[{_CJK_RANGES}]|\w+|[^\w\s]")
+_CJK = re.compile(rf"[{_CJK_RANGES}]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap upper-leaning estimate of the Gemma tokenizer: one token per CJK
+    character or punctuation mark, about one per four characters of a word.
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if _CJK.match(piece) or not piece[0].isalnum():
+            tokens += 1
+        else:
+            tokens += math.ceil(len(piece) / 4)
+    return math.ceil(tokens * 1.1)
+
+
+def prompt_tokens(prompt, inputs: dict) -> int:
+    messages = prompt.format_messages(**inputs)
+    return sum(estimate_tokens(str(m.content)) + MESSAGE_OVERHEAD for m in messages)
+
+
+def num_ctx_for(tokens: int, model_name: str, reserve: int = OUTPUT_RESERVE) -> Optional[int]:
+    """
+    num_ctx holding the prompt plus the answer; None if it does not fit. The
+    model's shared default unless the prompt would be truncated, then the
+    next power of two: each distinct value costs a runner reload in Ollama.
+    """
+    needed = tokens + reserve
+    limit = context_limit(model_name)
+    if needed > limit:
+        return None
+    default = default_num_ctx(model_name)
+    if needed <= default:
+        return default
+    return min(limit, 1 << (needed - 1).bit_length())
+
+
+def split_essay(essay: str, max_tokens: int) -> List[str]:
+    # Agrupa parágrafos inteiros; parágrafos grandes demais são quebrados por frases
+    units = []
+    for paragraph in filter(None, (p.strip() for p in essay.split("\n"))):
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+        else:
+            units.extend(s for s in re.split(r"(?<=[.!?。！？])\s*", paragraph) if s)
+
+    chunks, current, current_tokens = [], [], 0
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def map_reduce_grade(prompt, reduce_prompt, essay: str, model_name: str, endpoint: str,
+                           exam_type: Optional[str], busy=None, **options) -> str:
+    """
+    Grades an essay too long for the model's context: each chunk is graded
+    with the regular prompt (map), then the partial evaluations are merged
+    into one final evaluation in the rubric's format (reduce).
+    """
+    busy = busy or (lambda model: nullcontext())
+    limit = context_limit(model_name)
+    overhead = prompt_tokens(prompt, {"essay": ""})
+    chunks = split_essay(essay, max(256, limit - overhead - OUTPUT_RESERVE))
+    tracing.set_attribute("essay_chunks", len(chunks))
+
+    async def grade_chunk(i, chunk):
+        text = f"[Trecho {i} de {len(chunks)}]\n\n{chunk}"
+        num_ctx = num_ctx_for(overhead + estimate_tokens(text), model_name) or limit
+        chain = prompt | get_llm(model_name, num_ctx=num_ctx, **options) | output_parser
+        with busy(model_name):
+            return await chain.ainvoke({"essay": text}, config=telemetry.track(endpoint, exam_type, "map"))
+
+    with tracing.span("generate-map"):
+        partials = await asyncio.gather(*(grade_chunk(i, c) for i, c in enumerate(chunks, start=1)))
+
+    inputs = {"chunks": len(chunks),
+              "partials": "\n\n".join(f"Trecho {i}:\n{p}" for i, p in enumerate(partials, start=1))}
+    num_ctx = num_ctx_for(prompt_tokens(reduce_prompt, inputs), model_name) or limit
+    chain = reduce_prompt | get_llm(model_name, num_ctx=num_ctx, **options) | output_parser
+    with tracing.span("generate-reduce"), busy(model_name):
+        return await chain.ainvoke(inputs, config=telemetry.track(endpoint, exam_type, "reduce"))
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import re
+import unicodedata
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from nltk.corpus import stopwords
+
+HASH_BITS = 64
+BANDS = 8                        # 8 bandas de 8 bits: distância <= 7 sempre colide em alguma banda
+BAND_BITS = HASH_BITS // BANDS
+DEFAULT_THRESHOLD = 6            # bits de diferença para considerar quase-duplicata
+# Itens por índice: os índices por tema são compartilhados entre clientes; os menos usados saem primeiro
+DEDUPE_MAX_ITEMS = int(os.getenv("DEDUPE_MAX_ITEMS", "500"))
+# Textos já vistos -> SimHash/palavras-chave: os clientes reenviam a lista inteira de itens a cada requisição
+FINGERPRINT_CACHE_SIZE = int(os.getenv("DEDUPE_FINGERPRINT_CACHE", "16384"))
+
+_stop_words: Optional[Set[str]] = None
+
+
+def get_stop_words() -> Set[str]:
+    global _stop_words
+    if _stop_words is None:
+        _stop_words = set()
+        for language in ('portuguese', 'english', 'spanish'):
+            try:
+                _stop_words.update(stopwords.words(language))
+            except LookupError:
+                pass
+    return _stop_words
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', text)).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    stop_words = get_stop_words()
+    return [w for w in normalize(text).split() if w not in stop_words and not w.isdigit()]
+
+
+def _hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str, k: int = 2) -> int:
+    tokens = tokenize(text) or normalize(text).split()
+    features = tokens + [' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    weights = [0] * HASH_BITS
+    for feature, count in Counter(features).items():
+        h = _hash(feature)
+        for bit in range(HASH_BITS):
+            weights[bit] += count if (h >> bit) & 1 else -count
+    return sum(1 << bit for bit in range(HASH_BITS) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def keywords(text: str, n: int = 3) -> List[str]:
+    counts = Counter(w for w in tokenize(text) if len(w) > 3)
+    ranked = sorted(counts.items(), key=lambda x: (-x[1], -len(x[0])))
+    return [w for w, _ in ranked[:n]]
+
+
+@lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def fingerprint(text: str) -> int:
+    return simhash(text)
+
+
+@lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def _subtopics(text: str) -> Tuple[str, ...]:
+    return tuple(keywords(text))
+
+
+class DedupeIndex:
+    """
+    SimHash index of generated items with a compact summary of covered
+    subtopics. Holds at most `max_items` hashes (None: unbounded); past that
+    the least recently added or matched one is evicted.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD, max_items: Optional[int] = DEDUPE_MAX_ITEMS):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.hashes: "OrderedDict[int, Tuple[str, ...]]" = OrderedDict()  # hash -> keywords, em ordem de uso
+        self.bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self.subtopics: Counter = Counter()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _band_keys(self, h: int):
+        mask = (1 << BAND_BITS) - 1
+        return [(h >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+    def closest(self, h: int) -> Optional[Tuple[int, int]]:
+        """(distance, hash) of the indexed hash nearest to `h` among those sharing a band."""
+        best = None
+        for band, key in zip(self.bands, self._band_keys(h)):
+            for candidate in band.get(key, ()):
+                distance = hamming(h, candidate)
+                if best is None or distance < best[0]:
+                    best = distance, candidate
+        if best is not None and best[0] <= self.threshold:
+            self.hashes.move_to_end(best[1])
+        return best
+
+    def nearest(self, text: str) -> Optional[int]:
+        best = self.closest(fingerprint(text))
+        return best[0] if best is not None else None
+
+    def is_duplicate(self, text: str) -> bool:
+        distance = self.nearest(text)
+        return distance is not None and distance <= self.threshold
+
+    def _evict(self):
+        h, subtopics = self.hashes.popitem(last=False)
+        for band, key in zip(self.bands, self._band_keys(h)):
+            bucket = band[key]
+            bucket.remove(h)
+            if not bucket:
+                del band[key]
+        self.subtopics.subtract(subtopics)
+        self.subtopics += Counter()  # descarta contagens zeradas
+
+    def add_hash(self, h: int, subtopics: Optional[Tuple[str, ...]] = None) -> bool:
+        if h in self.hashes:
+            self.hashes.move_to_end(h)
+            return False
+        self.hashes[h] = subtopics or ()
+        for band, key in zip(self.bands, self._band_keys(h)):
+            band.setdefault(key, []).append(h)
+        self.subtopics.update(subtopics or ())
+        while self.max_items is not None and len(self.hashes) > self.max_items:
+            self._evict()
+        return True
+
+    def add(self, text: str) -> bool:
+        h = fingerprint(text)
+        if h in self.hashes:
+            self.hashes.move_to_end(h)
+            return False
+        return self.add_hash(h, _subtopics(text))
+
+    def summary(self, limit: int = 20) -> str:
+        return ', '.join(w for w, _ in self.subtopics.most_common(limit))
+
+
+class DedupeStore:
+    """One DedupeIndex per session (or per exam_type + theme), LRU-bounded."""
+
+    def __init__(self, max_indexes: int = 1024):
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[str, DedupeIndex]" = OrderedDict()
+
+    @staticmethod
+    def key(session_id: Optional[str], exam_type: str, tema: str) -> str:
+        if session_id:
+            return f"session:{session_id}"
+        return f"theme:{exam_type}:{normalize(tema)}"
+
+    def get(self, key: str) -> DedupeIndex:
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = DedupeIndex()
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(key)
+        return index
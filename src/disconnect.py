@@ -0,0 +1,70 @@
+import asyncio
+
+from . import telemetry, tracing
+
+GENERATION_PREFIXES = ("/call-",)
+
+
+class DisconnectMiddleware:
+    """
+    ASGI middleware that cancels generation requests when the client goes
+    away. The handler runs in its own task; once the request body has been
+    read, a watcher waits for `http.disconnect` and cancels it, which closes
+    the streaming HTTP request to Ollama and stops the decode there too.
+    """
+
+    def __init__(self, app, prefixes=GENERATION_PREFIXES):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope.get("path", "").startswith(self.prefixes):
+            return await self.app(scope, receive, send)
+
+        body_read = asyncio.Event()
+        disconnected = asyncio.Event()
+
+        async def receive_body():
+            # Depois do corpo, só o watcher lê do servidor; a aplicação apenas
+            # recebe o disconnect repassado (ex.: StreamingResponse o escuta)
+            if body_read.is_set():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                body_read.set()
+            elif not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def watch():
+            await body_read.wait()
+            while not disconnected.is_set():
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+
+        handler = asyncio.create_task(self.app(scope, receive_body, send))
+        watcher = asyncio.create_task(watch())
+        try:
+            await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            handler.cancel()
+            raise
+        finally:
+            watcher.cancel()
+        if handler.done():
+            return handler.result()
+
+        handler.cancel()
+        try:
+            await handler
+        except asyncio.CancelledError:
+            pass
+        # Rótulo da métrica: o template da rota casada (ex.: "call-essay"), nunca o path cru do cliente
+        route = scope.get("route")
+        endpoint = route.path.strip("/") if route is not None else "other"
+        telemetry.requests_cancelled.inc(endpoint=endpoint)
+        tracing.set_attribute("cancelled", True)
+        print(f"[CANCEL] Client disconnected, cancelled {endpoint}")
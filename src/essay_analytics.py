@@ -0,0 +1,157 @@
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+SKETCH_RELATIVE_ACCURACY = float(os.getenv("ANALYTICS_SKETCH_ACCURACY", "0.01"))
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Largura padrão das faixas do histograma por escala de nota (ENEM 0-1000, Exames Nacionais 0-200...)
+DEFAULT_BIN_WIDTH = {"enem": 100, "exames_nacionais": 20}
+
+
+class GradeSketch:
+    """
+    DDSketch-style quantile sketch: values fall in logarithmic buckets whose
+    width is a fixed fraction of the value, so every quantile is answered
+    within `relative_accuracy` and memory depends on the value range, not on
+    how many values were added. Counts are plain integers, so removing a
+    value (an essay updated or deleted) is exact.
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = defaultdict(int)
+        self.negative: Dict[int, int] = defaultdict(int)
+        self.zero = 0
+        self.count = 0
+
+    def _bucket(self, value: float):
+        if value == 0:
+            return None, 0
+        store = self.positive if value > 0 else self.negative
+        return store, math.ceil(math.log(abs(value)) / self._log_gamma)
+
+    def add(self, value: float, n: int = 1):
+        store, index = self._bucket(value)
+        if store is None:
+            self.zero += n
+        else:
+            store[index] += n
+        self.count += n
+
+    def remove(self, value: float, n: int = 1):
+        store, index = self._bucket(value)
+        if store is None:
+            self.zero -= n
+        else:
+            store[index] -= n
+            if store[index] <= 0:
+                del store[index]
+        self.count -= n
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+
+class ExamAggregate:
+    """Count, sum and sum of squares, the sketch and the per-grade counts of one exam_type."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.sketch = GradeSketch()
+        self.grades: Counter = Counter()  # nota -> essays; no máximo uma entrada por nota possível
+
+    def add(self, grade: float, n: int = 1):
+        self.count += n
+        self.total += grade * n
+        self.total_sq += grade * grade * n
+        self.sketch.add(grade, n)
+        self.grades[grade] += n
+
+    def remove(self, grade: float, n: int = 1):
+        self.count -= n
+        self.total -= grade * n
+        self.total_sq -= grade * grade * n
+        self.sketch.remove(grade, n)
+        self.grades[grade] -= n
+        if self.grades[grade] <= 0:
+            del self.grades[grade]
+
+    def histogram(self, bin_width: float) -> List[dict]:
+        bins = Counter()
+        for grade, n in self.grades.items():
+            bins[math.floor(grade / bin_width)] += n
+        return [{"start": i * bin_width, "end": (i + 1) * bin_width, "count": bins[i]}
+                for i in range(min(bins), max(bins) + 1)] if bins else []
+
+    def summary(self, bin_width: float) -> dict:
+        mean = self.total / self.count
+        variance = max(0.0, self.total_sq / self.count - mean * mean)
+        low, high = min(self.grades), max(self.grades)
+        return {
+            "count": self.count,
+            "mean": round(mean, 2),
+            "std": round(math.sqrt(variance), 2),
+            "min": low,
+            "max": high,
+            # O valor representativo do bucket pode cair ~1% fora do intervalo observado
+            "percentiles": {f"p{round(q * 100)}": round(min(max(self.sketch.quantile(q), low), high), 2)
+                            for q in QUANTILES},
+            "histogram": self.histogram(bin_width),
+        }
+
+
+class EssayAnalytics:
+    """
+    Per-exam_type grade aggregates kept up to date on every essay put and
+    delete, so a dashboard costs O(distinct grades), not O(essays).
+    """
+
+    def __init__(self):
+        self.by_exam: Dict[str, ExamAggregate] = defaultdict(ExamAggregate)
+
+    @staticmethod
+    def _exam(item: dict) -> str:
+        return item.get("exam_type") or "unknown"
+
+    def add(self, item: dict, n: int = 1):
+        self.by_exam[self._exam(item)].add(item["grade"], n)
+
+    def remove(self, item: dict):
+        exam_type = self._exam(item)
+        self.by_exam[exam_type].remove(item["grade"])
+        if self.by_exam[exam_type].count <= 0:
+            del self.by_exam[exam_type]
+
+    def reset(self, items: Iterable[dict] = ()):
+        self.by_exam.clear()
+        for item in items:
+            self.add(item)
+
+    def summary(self, exam_type: Optional[str] = None, bin_width: Optional[float] = None) -> dict:
+        selected = [exam_type] if exam_type is not None else sorted(self.by_exam)
+        return {
+            name: self.by_exam[name].summary(bin_width or DEFAULT_BIN_WIDTH.get(name, 1))
+            for name in selected if name in self.by_exam
+        }
@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .dedupe import BANDS, DedupeIndex
+
+# Bits de diferença no SimHash de 64 bits; as bandas do DedupeIndex só garantem achar distâncias < BANDS
+ESSAY_DUPLICATE_THRESHOLD = min(int(os.getenv("ESSAY_DUPLICATE_THRESHOLD", "3")), BANDS - 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS graded (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    exam_type TEXT NOT NULL,
+    simhash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class GradedEssayCache:
+    """
+    Persistent SimHash index of graded essays: a resubmission within
+    `threshold` bits of an essay already graded by the same model for the
+    same exam_type gets the stored result instead of a new LLM call. Rows
+    live in SQLite; the band index is kept in memory and catches up with rows
+    written by other workers on every lookup.
+    """
+
+    def __init__(self, path: str, threshold: int = ESSAY_DUPLICATE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._indexes: Dict[Tuple[str, str], DedupeIndex] = {}
+        self._ids: Dict[Tuple[str, str, int], int] = {}  # (model, exam_type, simhash) -> linha mais recente
+        self._last_id = 0
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        with self._lock:
+            self._catch_up()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _catch_up(self):
+        rows = self._conn.execute("SELECT id, model, exam_type, simhash FROM graded WHERE id > ? ORDER BY id",
+                                  (self._last_id,))
+        for row_id, model, exam_type, fingerprint in rows:
+            h = int(fingerprint, 16)
+            self._indexes.setdefault((model, exam_type), DedupeIndex(self.threshold, max_items=None)).add_hash(h)
+            self._ids[(model, exam_type, h)] = row_id
+            self._last_id = row_id
+
+    def lookup(self, model: str, exam_type: str, fingerprint: int) -> Optional[dict]:
+        """The stored result of the nearest graded essay within the threshold, with its distance and age."""
+        with self._lock:
+            self._catch_up()
+            index = self._indexes.get((model, exam_type))
+            best = index.closest(fingerprint) if index is not None else None
+            if best is None or best[0] > self.threshold:
+                return None
+            distance, h = best
+            result, created_at = self._conn.execute("SELECT result, created_at FROM graded WHERE id = ?",
+                                                    (self._ids[(model, exam_type, h)],)).fetchone()
+        return {"result": json.loads(result), "distance": distance, "graded_at": created_at}
+
+    def add(self, model: str, exam_type: str, fingerprint: int, result: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO graded (model, exam_type, simhash, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (model, exam_type, format(fingerprint, "016x"), json.dumps(result, ensure_ascii=False), time.time()))
+            self._conn.commit()
+            self._catch_up()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"essays": len(self._ids), "scopes": len(self._indexes), "threshold": self.threshold}
@@ -0,0 +1,195 @@
+import hashlib
+import html
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional
+
+from .dedupe import normalize
+from .retriever import EXAM_STOPWORD_LANGUAGES, preprocess_text
+
+SNIPPET_WORDS = int(os.getenv("SEARCH_SNIPPET_WORDS", "30"))
+FIELD_WEIGHTS = (1.0, 0.5)  # bm25: essay, feedback
+SYNC_BATCH = 1000
+# Termo presente em mais redações que isso tem idf ~0 e pontuá-lo varreria o índice inteiro
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "20000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    essay_id INTEGER PRIMARY KEY,
+    exam_type TEXT,
+    digest TEXT NOT NULL,
+    essay TEXT NOT NULL,
+    feedback TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_exam_type ON docs (exam_type);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    essay, feedback, exam_type UNINDEXED,
+    content='docs', content_rowid='essay_id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_vocab USING fts5vocab(docs_fts, 'row');
+"""
+
+
+def _digest(item: dict) -> str:
+    text = "\0".join((item.get("exam_type") or "", item.get("essay") or "", item.get("feedback") or ""))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _terms(text: str, exam_type: Optional[str]) -> List[str]:
+    # Sem acentos, como o tokenizer (remove_diacritics) grava os termos em docs_fts e docs_vocab
+    return list(dict.fromkeys(normalize(preprocess_text(text, EXAM_STOPWORD_LANGUAGES.get(exam_type))).split()))
+
+
+_normalize_token = lru_cache(maxsize=65536)(normalize)
+
+
+def snippet(text: str, terms: Iterable[str], words: int = SNIPPET_WORDS) -> tuple:
+    """The `words`-word window of `text` with the most query terms, hits wrapped in <mark>; (snippet, hits).
+    The essay text is HTML-escaped, so the only markup in the snippet is <mark>."""
+    wanted = {normalize(t) for t in terms}
+    tokens = text.split()
+    hits = [_normalize_token(token) in wanted for token in tokens]
+    if not tokens:
+        return "", 0
+    best_start, best, current = 0, sum(hits[:words]), sum(hits[:words])
+    for start in range(1, max(1, len(tokens) - words + 1)):
+        current += hits[start + words - 1] - hits[start - 1]
+        if current > best:
+            best_start, best = start, current
+    window = [f"<mark>{html.escape(token)}</mark>" if hit else html.escape(token)
+              for token, hit in zip(tokens[best_start:best_start + words], hits[best_start:best_start + words])]
+    prefix = "… " if best_start > 0 else ""
+    suffix = " …" if best_start + words < len(tokens) else ""
+    return prefix + " ".join(window) + suffix, best
+
+
+class EssaySearchIndex:
+    """
+    Full-text index over Essay.essay and Essay.feedback: SQLite FTS5 (an
+    on-disk inverted index) ranked with BM25, fed the text normalized by
+    retriever.preprocess_text with the exam's stopwords. Updated on every
+    essay write; at startup only essays whose content digest changed are
+    reindexed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Pesos do bm25 gravados na tabela: `ORDER BY rank` usa o caminho rápido do FTS5
+        with self._conn:
+            self._conn.execute("INSERT INTO docs_fts (docs_fts, rank) VALUES ('rank', ?)",
+                               (f"bm25({', '.join(map(str, FIELD_WEIGHTS))})",))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _delete(self, essay_id: int):
+        row = self._conn.execute("SELECT essay, feedback, exam_type FROM docs WHERE essay_id = ?",
+                                 (essay_id,)).fetchone()
+        if row is None:
+            return
+        # Tabela de conteúdo externo: o FTS5 precisa dos valores indexados para remover os termos
+        self._conn.execute("INSERT INTO docs_fts (docs_fts, rowid, essay, feedback, exam_type) "
+                           "VALUES ('delete', ?, ?, ?, ?)", (essay_id, *row))
+        self._conn.execute("DELETE FROM docs WHERE essay_id = ?", (essay_id,))
+
+    def _insert(self, item: dict, digest: str):
+        language = EXAM_STOPWORD_LANGUAGES.get(item.get("exam_type"))
+        essay = preprocess_text(item.get("essay") or "", language)
+        feedback = preprocess_text(item.get("feedback") or "", language)
+        self._conn.execute("INSERT INTO docs (essay_id, exam_type, digest, essay, feedback) VALUES (?, ?, ?, ?, ?)",
+                           (item["essay_id"], item.get("exam_type"), digest, essay, feedback))
+        self._conn.execute("INSERT INTO docs_fts (rowid, essay, feedback, exam_type) VALUES (?, ?, ?, ?)",
+                           (item["essay_id"], essay, feedback, item.get("exam_type")))
+
+    def index(self, item: dict):
+        digest = _digest(item)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT digest FROM docs WHERE essay_id = ?", (item["essay_id"],)).fetchone()
+            if row is not None and row[0] == digest:
+                return
+            self._delete(item["essay_id"])
+            self._insert(item, digest)
+
+    def remove(self, essay_id: int):
+        with self._lock, self._conn:
+            self._delete(essay_id)
+
+    def sync(self, items: Iterable[dict]) -> int:
+        """Reindexes essays changed while the index was not listening (crash, older version); returns changes."""
+        with self._lock:
+            indexed = dict(self._conn.execute("SELECT essay_id, digest FROM docs"))
+        changed = []
+        for item in items:
+            digest = _digest(item)
+            if indexed.pop(item["essay_id"], None) != digest:
+                changed.append((item, digest))
+        for start in range(0, len(changed), SYNC_BATCH):
+            with self._lock, self._conn:
+                for item, digest in changed[start:start + SYNC_BATCH]:
+                    self._delete(item["essay_id"])
+                    self._insert(item, digest)
+        stale = list(indexed)
+        for start in range(0, len(stale), SYNC_BATCH):
+            with self._lock, self._conn:
+                for essay_id in stale[start:start + SYNC_BATCH]:
+                    self._delete(essay_id)
+        return len(changed) + len(stale)
+
+    def _document_frequency(self, term: str) -> int:
+        row = self._conn.execute("SELECT doc FROM docs_vocab WHERE term = ?", (term,)).fetchone()
+        return row[0] if row else 0
+
+    def search(self, query: str, fetch: Callable[[int], Optional[dict]], exam_type: Optional[str] = None,
+               limit: int = 20) -> List[dict]:
+        terms = _terms(query, exam_type)
+        if not terms:
+            return []
+        with self._lock:
+            frequency = {term: self._document_frequency(term) for term in terms}
+            rare = [term for term in terms if 0 < frequency[term] <= SEARCH_MAX_CANDIDATES]
+            common = [term for term in terms if frequency[term] > SEARCH_MAX_CANDIDATES]
+            if not rare and not common:
+                return []
+            sql = "SELECT rowid, -rank FROM docs_fts WHERE docs_fts MATCH ?"
+            params = [" OR ".join(f'"{term}"' for term in rare or common)]
+            if not rare:
+                # Só termos onipresentes: pontua apenas as redações mais recentes
+                newest = self._conn.execute("SELECT COALESCE(MAX(essay_id), 0) FROM docs").fetchone()[0]
+                sql += " AND rowid > ?"
+                params.append(newest - SEARCH_MAX_CANDIDATES)
+            if exam_type is not None:
+                sql += " AND exam_type = ?"
+                params.append(exam_type)
+            sql += " ORDER BY rank LIMIT ?"
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+
+        results = []
+        for essay_id, score in rows:
+            item = fetch(essay_id)
+            if item is None:
+                continue
+            essay_snippet, essay_hits = snippet(item.get("essay") or "", terms)
+            feedback_snippet, feedback_hits = snippet(item.get("feedback") or "", terms)
+            field = "feedback" if feedback_hits > essay_hits else "essay"
+            results.append({
+                "essay_id": essay_id,
+                "score": round(score, 4),
+                "exam_type": item.get("exam_type"),
+                "grade": item.get("grade"),
+                "field": field,
+                "snippet": feedback_snippet if field == "feedback" else essay_snippet,
+            })
+        return results
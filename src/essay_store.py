@@ -0,0 +1,525 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from .essay_analytics import EssayAnalytics
+from .file_lock import FileLock, fsync_directory
+
+ESSAY_STORE = os.getenv("ESSAY_STORE", "journal")  # "journal" ou "sqlite"
+ESSAY_FSYNC_INTERVAL = float(os.getenv("ESSAY_FSYNC_INTERVAL", "0.01"))
+ESSAY_COMPACT_MIN_RECORDS = int(os.getenv("ESSAY_COMPACT_MIN_RECORDS", "1000"))
+
+
+def _matches(item: dict, exam_type: Optional[str] = None, min_grade: Optional[int] = None,
+             max_grade: Optional[int] = None, created_after: Optional[float] = None,
+             created_before: Optional[float] = None) -> bool:
+    created_at = item.get("created_at")
+    return ((exam_type is None or item.get("exam_type") == exam_type)
+            and (min_grade is None or item["grade"] >= min_grade)
+            and (max_grade is None or item["grade"] <= max_grade)
+            and (created_after is None or (created_at is not None and created_at >= created_after))
+            and (created_before is None or (created_at is not None and created_at < created_before)))
+
+
+class EssayStore:
+    """
+    Essays kept in memory (dict by essay_id) and persisted as a snapshot
+    (the JSON list in database.json) plus an append-only journal of puts and
+    deletes. Writes are group-committed: a flusher thread fsyncs the journal
+    once per batch window and every writer waiting on that batch returns
+    together. When the journal outgrows the live data it is compacted into
+    a new snapshot in the background.
+
+    Safe with several worker processes on the same files: every operation
+    takes an inter-process lock (shared for reads, exclusive for writes) and
+    first applies the journal records other processes appended since the
+    last one. The journal header carries a generation, bumped on each
+    rotation, and the ID high-water mark, so IDs are never handed out twice,
+    even after the highest essay is deleted and the server restarts.
+
+    Grade analytics (src/essay_analytics.py) are updated as each record is
+    applied, including records written by other processes.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = ESSAY_FSYNC_INTERVAL,
+                 compact_min_records: int = ESSAY_COMPACT_MIN_RECORDS):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.rotated_path = self.journal_path + ".1"
+        self.fsync_interval = fsync_interval
+        self.compact_min_records = compact_min_records
+        self.items: Dict[int, dict] = {}
+        self.analytics = EssayAnalytics()
+        self.next_id = 1
+        self._generation = 0
+        self._journal = None        # handle de escrita (append)
+        self._reader = None         # handle de leitura, logo após o último registro aplicado
+        self._journal_id = None     # (st_dev, st_ino) do journal aberto pelo reader
+        self._retired = []          # handles de journals rotacionados, aguardando o último fsync
+        self._journal_records = 0
+        self._file_lock = FileLock(path + ".lock")
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._written = 0   # sequência do último registro escrito no journal
+        self._synced = 0    # sequência do último registro com fsync
+        self._closing = False
+        self._flusher: Optional[threading.Thread] = None
+        self._compactor: Optional[threading.Thread] = None
+
+    def load(self):
+        """Reads the snapshot and journals into memory, without opening the store for writes."""
+        with self._lock, self._file_lock.shared():
+            self._load_all()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, self._file_lock.exclusive():
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb+") as f:
+                    size = f.seek(0, os.SEEK_END)
+                    if size and (f.seek(size - 1), f.read(1))[1] != b"\n":
+                        # Registro incompleto de um crash: fecha a linha para não corromper o próximo
+                        f.seek(0, os.SEEK_END)
+                        f.write(b"\n")
+            self._load_all()
+            if self._reader is None:
+                self._start_journal(self.journal_path)
+                self._open_reader()
+                self._read_records(self._reader)
+            self._journal = open(self.journal_path, "ab")
+        self._closing = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="essay-store-fsync", daemon=True)
+        self._flusher.start()
+        print(f"[ESSAYS] {len(self.items)} essays loaded, {self._journal_records} journal records")
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            self._flushed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._compactor is not None:
+            self._compactor.join()
+        for handle in (self._journal, self._reader, *self._retired):
+            if handle is not None:
+                handle.close()
+        self._journal = self._reader = None
+        self._retired = []
+        self._file_lock.close()
+
+    # Recuperação: snapshot + journal rotacionado (compactação pendente) + journal atual
+    def _load_all(self):
+        self.items = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    self.items[item["essay_id"]] = item
+        self.analytics.reset(self.items.values())
+        self.next_id = max(self.next_id, max(self.items, default=0) + 1)
+        if os.path.exists(self.rotated_path):
+            with open(self.rotated_path, "rb") as f:
+                self._read_records(f)
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if os.path.exists(self.journal_path):
+            self._open_reader()
+            self._journal_records = self._read_records(self._reader)
+
+    def _open_reader(self):
+        self._reader = open(self.journal_path, "rb")
+        stat = os.fstat(self._reader.fileno())
+        self._journal_id = (stat.st_dev, stat.st_ino)
+
+    def _read_records(self, f) -> int:
+        records = 0
+        while True:
+            line = f.readline()
+            if not line:
+                return records
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"[ESSAYS] Ignoring torn record in {os.path.basename(f.name)}")
+                continue
+            if record["op"] == "header":
+                self._generation = record["generation"]
+                self.next_id = max(self.next_id, record["next_id"])
+                continue
+            if record["op"] == "put":
+                previous = self.items.get(record["item"]["essay_id"])
+                if previous is not None:
+                    self.analytics.remove(previous)
+                self.items[record["item"]["essay_id"]] = record["item"]
+                self.analytics.add(record["item"])
+                self.next_id = max(self.next_id, record["item"]["essay_id"] + 1)
+            else:
+                previous = self.items.pop(record["essay_id"], None)
+                if previous is not None:
+                    self.analytics.remove(previous)
+            records += 1
+
+    def _catch_up(self):
+        # Com os dois locks: aplica o que outros processos escreveram desde a última operação
+        self._journal_records += self._read_records(self._reader)
+        stat = os.stat(self.journal_path)
+        if (stat.st_dev, stat.st_ino) == self._journal_id:
+            return
+        # Outro processo rotacionou o journal; o antigo já está completo
+        self._journal_records += self._read_records(self._reader)
+        generation = self._generation
+        self._reader.close()
+        self._open_reader()
+        self._journal_records = self._read_records(self._reader)
+        if self._generation != generation + 1:
+            # Perdemos uma geração inteira (já compactada): recarrega a partir do snapshot
+            self._load_all()
+        if self._journal is not None:
+            self._retired.append(self._journal)
+            self._journal = open(self.journal_path, "ab")
+
+    def _start_journal(self, path: str):
+        header = {"op": "header", "generation": self._generation + 1, "next_id": self.next_id}
+        with open(path, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Leitura: O(1) por id, depois de aplicar as escritas de outros processos
+    def get(self, essay_id: int) -> Optional[dict]:
+        with self._lock, self._file_lock.shared():
+            self._catch_up()
+            return self.items.get(essay_id)
+
+    def list(self) -> List[dict]:
+        with self._lock, self._file_lock.shared():
+            self._catch_up()
+            return list(self.items.values())
+
+    def iter_items(self, **filters) -> Iterator[dict]:
+        # A cópia é só de referências: os registros nunca são alterados no lugar (update troca o dict)
+        for item in self.list():
+            if _matches(item, **filters):
+                yield item
+
+    def grade_stats(self, exam_type: Optional[str] = None, bin_width: Optional[float] = None) -> dict:
+        with self._lock, self._file_lock.shared():
+            self._catch_up()
+            return self.analytics.summary(exam_type, bin_width)
+
+    def page(self, limit: int, cursor: Optional[int] = None, **filters) -> List[dict]:
+        """Newest first, essay_id < cursor. A linear scan here; use ESSAY_STORE=sqlite for large histories."""
+        selected = []
+        for item in reversed(self.list()):
+            if (cursor is None or item["essay_id"] < cursor) and _matches(item, **filters):
+                selected.append(item)
+                if len(selected) >= limit:
+                    break
+        return selected
+
+    # Escrita: anexa ao journal sob o lock exclusivo e espera o fsync do lote
+    def create(self, item: dict) -> dict:
+        with self._lock, self._file_lock.exclusive():
+            self._catch_up()
+            item = {**item, "essay_id": self.next_id, "created_at": time.time()}
+            seq = self._append({"op": "put", "item": item})
+        self._wait_synced(seq)
+        return item
+
+    def update(self, essay_id: int, item: dict) -> Optional[dict]:
+        with self._lock, self._file_lock.exclusive():
+            self._catch_up()
+            if essay_id not in self.items:
+                return None
+            item = {**item, "essay_id": essay_id, "created_at": self.items[essay_id].get("created_at")}
+            seq = self._append({"op": "put", "item": item})
+        self._wait_synced(seq)
+        return item
+
+    def delete(self, essay_id: int) -> bool:
+        with self._lock, self._file_lock.exclusive():
+            self._catch_up()
+            if essay_id not in self.items:
+                return False
+            seq = self._append({"op": "delete", "essay_id": essay_id})
+        self._wait_synced(seq)
+        return True
+
+    def _append(self, record: dict) -> int:
+        # Visível para os outros processos antes de soltar o lock; aplicado pelo próprio reader
+        self._journal.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._journal.flush()
+        self._journal_records += self._read_records(self._reader)
+        self._written += 1
+        self._flushed.notify_all()
+        return self._written
+
+    def _wait_synced(self, seq: int):
+        with self._lock:
+            while self._synced < seq and not self._closing:
+                self._flushed.wait()
+
+    # Group commit: um fsync por janela de ESSAY_FSYNC_INTERVAL, qualquer que seja o número de escritas
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while self._synced == self._written and not self._closing:
+                    self._flushed.wait()
+                if not self._closing:
+                    self._flushed.wait_for(lambda: self._closing, timeout=self.fsync_interval)
+                closing = self._closing
+                target = self._written
+                handles, self._retired = [*self._retired, self._journal], []
+            # Só esta thread fecha handles de escrita, então os fds continuam válidos fora do lock
+            for handle in handles:
+                os.fsync(handle.fileno())
+            for handle in handles[:-1]:
+                handle.close()
+            with self._lock:
+                self._synced = max(self._synced, target)
+                self._flushed.notify_all()
+                if (not closing and self._journal_records >= max(self.compact_min_records, len(self.items))
+                        and (self._compactor is None or not self._compactor.is_alive())):
+                    rotated = self._rotate()
+                    if rotated is not None:
+                        self._compactor = threading.Thread(target=self._compact, args=rotated,
+                                                           name="essay-store-compact", daemon=True)
+                        self._compactor.start()
+                if closing and self._synced == self._written:
+                    return
+
+    def _rotate(self):
+        # Com o lock de thread: o journal atual vira .1 e um novo começa com o cabeçalho da próxima geração
+        with self._file_lock.exclusive():
+            self._catch_up()
+            if self._journal_records < max(self.compact_min_records, len(self.items)):
+                return None  # outro processo acabou de rotacionar
+            if os.path.exists(self.rotated_path):
+                # Compactação anterior pendente (processo encerrado ou ainda gravando): conclui aqui
+                self._write_snapshot(list(self.items.values()))
+                os.remove(self.rotated_path)
+            tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+            self._start_journal(tmp_path)
+            try:
+                os.replace(self.journal_path, self.rotated_path)
+            except PermissionError:
+                # Windows não renomeia arquivo aberto por outro processo: adia a compactação
+                os.remove(tmp_path)
+                return None
+            os.replace(tmp_path, self.journal_path)
+            fsync_directory(os.path.dirname(self.path) or ".")
+            stat = os.stat(self.rotated_path)
+            self._catch_up()
+            return list(self.items.values()), (stat.st_dev, stat.st_ino)
+
+    def _compact(self, items: List[dict], rotated_id):
+        tmp_path = self._write_snapshot_tmp(items)
+        with self._lock, self._file_lock.exclusive():
+            try:
+                stat = os.stat(self.rotated_path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None or (stat.st_dev, stat.st_ino) != rotated_id:
+                # Outro processo já concluiu esta compactação com um estado mais novo
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self.path)
+            os.remove(self.rotated_path)
+            fsync_directory(os.path.dirname(self.path) or ".")
+        print(f"[ESSAYS] Compacted journal into a snapshot of {len(items)} essays")
+
+    def _write_snapshot_tmp(self, items: List[dict]) -> str:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def _write_snapshot(self, items: List[dict]):
+        os.replace(self._write_snapshot_tmp(items), self.path)
+        fsync_directory(os.path.dirname(self.path) or ".")
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS essays (
+    essay_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    essay TEXT NOT NULL,
+    grade INTEGER NOT NULL,
+    exam_type TEXT,
+    feedback TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS essays_exam_type ON essays (exam_type, essay_id);
+CREATE INDEX IF NOT EXISTS essays_grade ON essays (grade, essay_id);
+CREATE INDEX IF NOT EXISTS essays_created_at ON essays (created_at);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS grade_counts (
+    exam_type TEXT NOT NULL,
+    grade INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (exam_type, grade)
+);
+CREATE TRIGGER IF NOT EXISTS essays_grade_insert AFTER INSERT ON essays BEGIN
+    INSERT INTO grade_counts (exam_type, grade, count) VALUES (COALESCE(NEW.exam_type, 'unknown'), NEW.grade, 1)
+    ON CONFLICT (exam_type, grade) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS essays_grade_delete AFTER DELETE ON essays BEGIN
+    UPDATE grade_counts SET count = count - 1 WHERE exam_type = COALESCE(OLD.exam_type, 'unknown') AND grade = OLD.grade;
+    DELETE FROM grade_counts WHERE count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS essays_grade_update AFTER UPDATE OF grade, exam_type ON essays BEGIN
+    UPDATE grade_counts SET count = count - 1 WHERE exam_type = COALESCE(OLD.exam_type, 'unknown') AND grade = OLD.grade;
+    DELETE FROM grade_counts WHERE count <= 0;
+    INSERT INTO grade_counts (exam_type, grade, count) VALUES (COALESCE(NEW.exam_type, 'unknown'), NEW.grade, 1)
+    ON CONFLICT (exam_type, grade) DO UPDATE SET count = count + 1;
+END;
+"""
+COLUMNS = ("essay_id", "essay", "grade", "exam_type", "feedback", "created_at")
+
+
+class SqliteEssayStore:
+    """
+    Same interface as EssayStore, backed by SQLite (WAL) with indexes on
+    exam_type, grade and created_at, so filtered keyset pages cost the same
+    whatever the size of the history. SQLite's own locking makes it safe
+    across worker processes. On first open the essays of the JSON store
+    (snapshot + journal) are imported once.
+    """
+
+    def __init__(self, path: str, json_path: Optional[str] = None):
+        self.path = path
+        self.json_path = json_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # timeout: espera o lock de escrita de outro worker em vez de falhar com "database is locked"
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        backfill = not self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'grade_counts'").fetchone()
+        self._conn.executescript(SQLITE_SCHEMA)
+        if backfill:
+            # Banco criado antes dos triggers de analytics: conta o que já existe uma única vez
+            with self._conn:
+                self._conn.execute("INSERT OR IGNORE INTO grade_counts (exam_type, grade, count) "
+                                   "SELECT COALESCE(exam_type, 'unknown'), grade, COUNT(*) FROM essays "
+                                   "GROUP BY COALESCE(exam_type, 'unknown'), grade")
+        self._migrate()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _migrate(self):
+        if self.json_path is None:
+            return
+        with self._lock:
+            # BEGIN IMMEDIATE: com vários workers, só o primeiro importa
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+                    self._conn.rollback()
+                    return
+                source = EssayStore(self.json_path)
+                source.load()
+                source.close()
+                rows = [tuple(item.get(c) for c in COLUMNS) for item in source.items.values()]
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO essays ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows)
+                # Mantém o high-water mark de IDs do journal (IDs apagados não voltam)
+                if not self._conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'essays'",
+                                          (source.next_id - 1,)).rowcount:
+                    self._conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('essays', ?)",
+                                       (source.next_id - 1,))
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                                   (str(time.time()),))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        print(f"[ESSAYS] Migrated {len(rows)} essays from {os.path.basename(self.json_path)} to SQLite")
+
+    def get(self, essay_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM essays WHERE essay_id = ?", (essay_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM essays ORDER BY essay_id")]
+
+    def grade_stats(self, exam_type: Optional[str] = None, bin_width: Optional[float] = None) -> dict:
+        """Built from grade_counts (kept by triggers): O(distinct grades) whatever the number of essays."""
+        analytics = EssayAnalytics()
+        with self._lock:
+            rows = self._conn.execute("SELECT exam_type, grade, count FROM grade_counts").fetchall()
+        for row in rows:
+            analytics.add({"exam_type": row["exam_type"], "grade": row["grade"]}, row["count"])
+        return analytics.summary(exam_type, bin_width)
+
+    def iter_items(self, batch_size: int = 500, **filters) -> Iterator[dict]:
+        """Oldest first, in keyset batches, so the lock is never held while the caller consumes."""
+        cursor = 0
+        while True:
+            batch = self._select("essay_id > ?", cursor, "ASC", batch_size, **filters)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            cursor = batch[-1]["essay_id"]
+
+    def page(self, limit: int, cursor: Optional[int] = None, **filters) -> List[dict]:
+        """Newest first, essay_id < cursor: a range scan on an index, never an OFFSET."""
+        return self._select("essay_id < ?", cursor, "DESC", limit, **filters)
+
+    def _select(self, keyset: str, cursor: Optional[int], order: str, limit: int,
+                exam_type: Optional[str] = None, min_grade: Optional[int] = None, max_grade: Optional[int] = None,
+                created_after: Optional[float] = None, created_before: Optional[float] = None) -> List[dict]:
+        clauses, params = [], []
+        for clause, value in ((keyset, cursor), ("exam_type = ?", exam_type), ("grade >= ?", min_grade),
+                              ("grade <= ?", max_grade), ("created_at >= ?", created_after),
+                              ("created_at < ?", created_before)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM essays {where} ORDER BY essay_id {order} LIMIT ?",
+                                      (*params, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def create(self, item: dict) -> dict:
+        item = {**item, "created_at": time.time()}
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO essays (essay, grade, exam_type, feedback, created_at) VALUES (?, ?, ?, ?, ?)",
+                (item["essay"], item["grade"], item.get("exam_type"), item.get("feedback"), item["created_at"]))
+        return {**item, "essay_id": cursor.lastrowid}
+
+    def update(self, essay_id: int, item: dict) -> Optional[dict]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "UPDATE essays SET essay = ?, grade = ?, exam_type = ?, feedback = ? WHERE essay_id = ? "
+                "RETURNING *",
+                (item["essay"], item["grade"], item.get("exam_type"), item.get("feedback"), essay_id)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, essay_id: int) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM essays WHERE essay_id = ?", (essay_id,)).rowcount > 0
+
+
+def create_essay_store(json_path: str, backend: str = ESSAY_STORE):
+    """The essay store selected by ESSAY_STORE; not opened yet."""
+    if backend == "sqlite":
+        return SqliteEssayStore(os.path.splitext(json_path)[0] + ".sqlite3", json_path=json_path)
+    return EssayStore(json_path)
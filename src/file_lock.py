@@ -0,0 +1,72 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Inter-process lock on a side file: flock (shared or exclusive) on POSIX,
+    msvcrt.locking on Windows, where every lock is exclusive. It is neither
+    reentrant nor a thread lock: threads of one process share the lock and
+    must serialize among themselves before taking it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    @contextmanager
+    def _locked(self, shared: bool):
+        fd = self._open()
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            return
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                continue  # LK_LOCK desiste após ~10 tentativas; continua esperando
+        try:
+            yield
+        finally:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def shared(self):
+        return self._locked(shared=True)
+
+    def exclusive(self):
+        return self._locked(shared=False)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def fsync_directory(path: str):
+    """Makes a rename inside `path` durable (no-op on Windows, which has no directory fsync)."""
+    if fcntl is None:
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
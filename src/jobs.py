@@ -0,0 +1,182 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "600"))  # segundos entre limpezas de jobs expirados
+
+
+class Job(BaseModel):
+    job_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    kind: str
+    status: Literal["queued", "running", "done", "failed"] = "queued"
+    payload: dict
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = Field(default_factory=time.time)
+    run_after: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+
+Handler = Callable[[dict], Awaitable[Any]]
+
+
+class JobManager:
+    """
+    Background jobs for long generations: bounded worker pool, state persisted
+    as one JSON file per job so queued work survives a restart.
+    """
+
+    def __init__(self, directory: str, workers: int = JOB_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self.handlers: Dict[str, Handler] = {}
+        self.jobs: Dict[str, Job] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    def register(self, kind: str, handler: Handler):
+        self.handlers[kind] = handler
+
+    # Persistência
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _persist(self, job: Job):
+        tmp_path = self._path(job.job_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(job.model_dump_json())
+        os.replace(tmp_path, self._path(job.job_id))
+
+    def _load(self):
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = Job.model_validate_json(f.read())
+            except (OSError, ValueError):
+                print(f"[JOBS] Ignoring unreadable job file {name}")
+                continue
+            if self._expired(job, now):
+                os.remove(path)
+                continue
+            if job.status == "running":
+                # Interrompido por um restart: volta para a fila
+                job.status = "queued"
+                job.started_at = None
+            self.jobs[job.job_id] = job
+
+    @staticmethod
+    def _expired(job: Job, now: float) -> bool:
+        return job.finished and job.finished_at is not None and now - job.finished_at > JOB_RETENTION_SECONDS
+
+    def prune(self) -> int:
+        """Drops finished jobs past the retention window from memory and disk; returns how many."""
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items() if self._expired(job, now)]
+        for job_id in expired:
+            del self.jobs[job_id]
+            self._events.pop(job_id, None)
+            try:
+                os.remove(self._path(job_id))
+            except FileNotFoundError:
+                pass
+        return len(expired)
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(JOB_SWEEP_INTERVAL)
+            self.prune()
+
+    # Ciclo de vida
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._load()
+        for job in sorted(self.jobs.values(), key=lambda j: j.created_at):
+            if not job.finished:
+                self._enqueue(job)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        print(f"[JOBS] {self.workers} workers, {self.pending()} pending jobs restored.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _enqueue(self, job: Job):
+        delay = (job.run_after or 0) - time.time()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job.job_id)
+        else:
+            self._queue.put_nowait(job.job_id)
+
+    # API
+    async def submit(self, kind: str, payload: dict, run_after: Optional[float] = None) -> Job:
+        if kind not in self.handlers:
+            raise KeyError(kind)
+        job = Job(kind=kind, payload=payload, run_after=run_after)
+        self.jobs[job.job_id] = job
+        self._persist(job)
+        self._enqueue(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def pending(self) -> int:
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.finished or timeout <= 0:
+            return job
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            self._persist(job)
+            try:
+                result = await self.handlers[job.kind](job.payload)
+                job.result = result.model_dump() if isinstance(result, BaseModel) else result
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "queued"
+                job.started_at = None
+                self._persist(job)
+                raise
+            except Exception as e:
+                job.error = getattr(e, "detail", None) or f"{type(e).__name__}: {e}"
+                job.status = "failed"
+            job.finished_at = time.time()
+            self._persist(job)
+            event = self._events.pop(job_id, None)
+            if event is not None:
+                event.set()
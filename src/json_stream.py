@@ -0,0 +1,58 @@
+import json
+from typing import List
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for streamed LLM output.
+
+    Feed it the text chunks as they arrive and it returns every object of the
+    first JSON array as soon as its closing brace is seen, e.g. each question of
+    `{"questions": [{...}, {...}]}` or of a bare `[{...}, {...}]`.
+    """
+
+    def __init__(self):
+        self._stack = []           # open containers ('{' or '[')
+        self._in_string = False
+        self._escaped = False
+        self._array_level = None   # depth of the array whose items are emitted
+        self._capturing = False
+        self._current = []
+
+    def feed(self, chunk: str) -> List[dict]:
+        items = []
+        for char in chunk:
+            if self._capturing:
+                self._current.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                if (char == "{" and not self._capturing
+                        and self._array_level is not None
+                        and len(self._stack) == self._array_level):
+                    self._capturing = True
+                    self._current = [char]
+                self._stack.append(char)
+                if char == "[" and self._array_level is None:
+                    self._array_level = len(self._stack)
+            elif char in "]}":
+                if self._stack:
+                    self._stack.pop()
+                if (char == "}" and self._capturing
+                        and len(self._stack) == self._array_level):
+                    self._capturing = False
+                    try:
+                        items.append(json.loads("".join(self._current)))
+                    except json.JSONDecodeError:
+                        pass
+        return items
@@ -0,0 +1,53 @@
+import os
+from functools import lru_cache
+from typing import Optional, Type
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_ollama.chat_models import ChatOllama
+from pydantic import BaseModel
+
+from .utils import OLLAMA_BASE_URL
+
+output_parser = StrOutputParser()
+
+# Teto de contexto por modelo (tokens), limitado por MAX_NUM_CTX para caber na memória
+MODEL_CONTEXT = {
+    "gemma3:1b": 32768,
+    "gemma3n:e2b": 32768,
+    "gemma3n:e4b": 32768,
+    "gemma3:4b": 131072,
+    "gemma3:12b": 131072,
+    "gemma3:27b": 131072,
+}
+MAX_NUM_CTX = int(os.getenv("MAX_NUM_CTX", "16384"))
+# num_ctx enviado em toda chamada: o Ollama recarrega o modelo quando o num_ctx muda
+NUM_CTX = int(os.getenv("NUM_CTX", "8192"))
+
+
+def context_limit(model_name: str) -> int:
+    return min(MODEL_CONTEXT.get(model_name, 8192), MAX_NUM_CTX)
+
+
+def default_num_ctx(model_name: str) -> int:
+    return min(NUM_CTX, context_limit(model_name))
+
+
+@lru_cache(maxsize=64)
+def _chat_model(model_name: str, schema: Optional[Type[BaseModel]]) -> ChatOllama:
+    # Cada ChatOllama abre seus próprios clientes HTTP; reaproveitar evita
+    # recriar o pool de conexões a cada requisição.
+    return ChatOllama(model=model_name,
+                      base_url=OLLAMA_BASE_URL,
+                      format=schema.model_json_schema() if schema else None)
+
+
+def get_llm(model_name: str, schema: Optional[Type[BaseModel]] = None, **options):
+    """
+    Shared ChatOllama for (model, output schema) with per-request sampling
+    options (temperature, seed, num_ctx...) bound on top. num_ctx defaults
+    to the model's shared value so every endpoint keeps the runner loaded.
+    """
+    llm = _chat_model(model_name, schema)
+    options = {k: v for k, v in options.items() if v is not None}
+    options.setdefault("num_ctx", default_num_ctx(model_name))
+    return llm.bind(options=options)
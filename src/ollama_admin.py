@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+from typing import Optional, Set
+
+import httpx
+
+TAGS_TTL = float(os.getenv("OLLAMA_TAGS_TTL", "10"))
+
+
+def _with_tag(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaAdmin:
+    """
+    Non-blocking client for Ollama's admin endpoints (/api/version, /api/tags,
+    /api/delete) with a short-TTL cache of the installed models.
+    """
+
+    def __init__(self, base_url: str, ttl: float = TAGS_TTL):
+        self.base_url = base_url
+        self.ttl = ttl
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tags: Optional[dict] = None
+        self._names: Set[str] = set()
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=httpx.Timeout(10.0, read=30.0))
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def invalidate(self):
+        self._fetched_at = 0.0
+
+    async def version(self) -> dict:
+        response = await self.client.get("/api/version")
+        response.raise_for_status()
+        return response.json()
+
+    async def tags(self, force: bool = False) -> dict:
+        if not force and self._tags is not None and time.monotonic() - self._fetched_at < self.ttl:
+            return self._tags
+        async with self._lock:
+            # Outra corrotina pode ter atualizado enquanto esperávamos o lock
+            if not force and self._tags is not None and time.monotonic() - self._fetched_at < self.ttl:
+                return self._tags
+            try:
+                response = await self.client.get("/api/tags")
+            except httpx.HTTPError:
+                return {"error": "Failed to fetch models info"}
+            if response.status_code != 200:
+                return {"error": "Failed to fetch models info"}
+            self._tags = response.json()
+            self._names = set()
+            for model in self._tags.get("models", []):
+                for key in ("model", "name"):
+                    if model.get(key):
+                        self._names.add(model[key])
+            self._fetched_at = time.monotonic()
+            return self._tags
+
+    async def has_model(self, model_name: str) -> bool:
+        await self.tags()
+        return model_name in self._names or _with_tag(model_name) in self._names
+
+    async def delete(self, model_name: str) -> dict:
+        response = await self.client.request("DELETE", "/api/delete", json={"model": model_name})
+        self.invalidate()
+        if response.status_code == 200:
+            return {"message": f"Model '{model_name}' deleted successfully"}
+        return {
+            "error": f"Failed to delete model '{model_name}'",
+            "status_code": response.status_code,
+            "response": response.text
+        }
@@ -0,0 +1,110 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from . import telemetry
+
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "2"))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL_SECONDS", "900"))
+
+Producer = Callable[[], Awaitable[Any]]
+
+
+class SessionBuffer:
+    def __init__(self, signature: Hashable):
+        self.signature = signature
+        self.items = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.touched = time.monotonic()
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+class PrefetchStore:
+    """
+    Per-session buffer of the next items (flashcards, questions), refilled in
+    the background while the student reads the current one.
+
+    A buffer is tied to a signature (exam_type, normalized theme, model...);
+    a request with a different signature discards it, so a theme change
+    never serves stale items.
+    """
+
+    def __init__(self, depth: int = PREFETCH_DEPTH, ttl: float = PREFETCH_TTL, max_sessions: int = 1024):
+        self.depth = depth
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._buffers: "OrderedDict[tuple, SessionBuffer]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def _discard(self, key):
+        buffer = self._buffers.pop(key, None)
+        if buffer is not None:
+            buffer.cancel()
+
+    async def take(self, session_id: str, endpoint: str, signature: Hashable):
+        """Next prefetched item, waiting for one already being generated; None on a miss."""
+        key = (session_id, endpoint)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            telemetry.prefetch_requests.inc(endpoint=endpoint, outcome="miss")
+            return None
+        if buffer.signature != signature or time.monotonic() - buffer.touched > self.ttl:
+            self._discard(key)
+            telemetry.prefetch_requests.inc(endpoint=endpoint, outcome="stale")
+            return None
+
+        self._buffers.move_to_end(key)
+        buffer.touched = time.monotonic()
+        if not buffer.items and buffer.task is not None and not buffer.task.done():
+            # A geração do próximo item já começou: esperar é mais rápido que gerar outro
+            waiter = asyncio.ensure_future(buffer.ready.wait())
+            await asyncio.wait({waiter, buffer.task}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+        if not buffer.items:
+            telemetry.prefetch_requests.inc(endpoint=endpoint, outcome="miss")
+            return None
+        item = buffer.items.popleft()
+        if not buffer.items:
+            buffer.ready.clear()
+        telemetry.prefetch_requests.inc(endpoint=endpoint, outcome="hit")
+        return item
+
+    def refill(self, session_id: str, endpoint: str, signature: Hashable, produce: Producer):
+        key = (session_id, endpoint)
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.signature != signature:
+            self._discard(key)
+            buffer = self._buffers[key] = SessionBuffer(signature)
+            while len(self._buffers) > self.max_sessions:
+                self._discard(next(iter(self._buffers)))
+        buffer.touched = time.monotonic()
+        if len(buffer.items) >= self.depth or (buffer.task is not None and not buffer.task.done()):
+            return
+        # Contexto limpo: a geração em segundo plano não entra no trace da requisição atual
+        buffer.task = asyncio.create_task(self._fill(buffer, produce, endpoint), context=contextvars.Context())
+
+    async def _fill(self, buffer: SessionBuffer, produce: Producer, endpoint: str):
+        while len(buffer.items) < self.depth:
+            try:
+                item = await produce()
+            except Exception as e:
+                print(f"[PREFETCH] {endpoint} prefetch failed: {e}")
+                return
+            buffer.items.append(item)
+            buffer.ready.set()
+
+    async def aclose(self):
+        tasks = [b.task for b in self._buffers.values() if b.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._buffers.clear()
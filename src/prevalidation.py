@@ -0,0 +1,138 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import FrozenSet, Optional, Tuple
+
+from .cascade import Rubric
+from .dedupe import normalize
+
+MIN_WORDS = int(os.getenv("ESSAY_MIN_WORDS", "50"))
+MIN_CJK_CHARS = int(os.getenv("ESSAY_MIN_CJK_CHARS", "150"))
+WORDS_PER_LINE = 10   # linha manuscrita da folha de redação, para o limite de linhas do ENEM
+MIN_LINES = 8         # ENEM: até 7 linhas é "texto insuficiente"
+COPY_SHINGLE = 5
+COPY_THRESHOLD = 0.5  # fração dos 5-gramas da redação que aparecem no prompt
+
+EXAM_ESSAY_LANGUAGE = {
+    "enem": "pt",
+    "exames_nacionais": "pt",
+    "icfes": "es",
+    "exani": "es",
+    "sat": "en",
+    "cuet": "en",
+    "ielts": "en",
+    "gaokao": "zh",
+}
+
+# Palavras funcionais (sem acento, após normalize) exclusivas de cada idioma
+_FUNCTION_WORDS = {
+    "pt": {"que", "nao", "uma", "os", "do", "da", "em", "um", "para", "com", "no", "na", "mais", "as", "dos", "das",
+           "como", "mas", "ao", "ele", "seu", "sua", "ou", "quando", "muito", "nos", "ja", "tambem", "pelo", "pela",
+           "isso", "sao", "e", "o", "a", "de", "se", "por", "entre", "sem", "sobre"},
+    "es": {"que", "no", "una", "los", "del", "el", "en", "un", "para", "con", "la", "las", "mas", "como", "pero",
+           "al", "lo", "su", "sus", "le", "ya", "este", "esta", "porque", "muy", "cuando", "tambien", "es", "son",
+           "hay", "y", "de", "se", "por", "entre", "sin", "sobre", "o", "a"},
+    "en": {"the", "of", "and", "to", "in", "is", "that", "for", "it", "as", "was", "with", "be", "by", "on", "not",
+           "this", "are", "or", "from", "at", "which", "but", "have", "an", "they", "their", "has", "its", "we",
+           "can", "been", "there", "will", "more", "a"},
+}
+_DISTINCTIVE = {
+    lang: frozenset(words - set().union(*(w for other, w in _FUNCTION_WORDS.items() if other != lang)))
+    for lang, words in _FUNCTION_WORDS.items()
+}
+_CJK = re.compile(r"[\u3400-\u9fff]")
+
+MESSAGES = {
+    "pt": {
+        "empty": "A redação está em branco.",
+        "insufficient": "Texto insuficiente: a redação tem menos do que o mínimo de linhas exigido.",
+        "language": "A redação não está escrita no idioma exigido pelo exame.",
+        "copied": "A redação reproduz o texto da proposta em vez de desenvolver um texto próprio.",
+    },
+    "es": {
+        "empty": "El ensayo está en blanco.",
+        "insufficient": "Texto insuficiente: el ensayo no alcanza la extensión mínima.",
+        "language": "El ensayo no está escrito en el idioma exigido por el examen.",
+        "copied": "El ensayo copia el texto de la consigna en lugar de desarrollar un texto propio.",
+    },
+    "en": {
+        "empty": "The essay is blank.",
+        "insufficient": "Insufficient text: the essay is shorter than the minimum length.",
+        "language": "The essay is not written in the language required by the exam.",
+        "copied": "The essay copies the prompt text instead of developing an original response.",
+    },
+    "zh": {
+        "empty": "作文为空。",
+        "insufficient": "字数不足：作文未达到最低字数要求。",
+        "language": "作文未使用考试要求的语言。",
+        "copied": "作文抄袭了题目文本，而不是独立写作。",
+    },
+}
+
+
+def detect_language(text: str) -> Optional[str]:
+    """Function-word vote among pt/es/en, CJK share for zh; None when there is too little evidence."""
+    letters = [c for c in text if c.isalpha()]
+    if letters and len(_CJK.findall(text)) / len(letters) > 0.3:
+        return "zh"
+    words = normalize(text).split()
+    hits = {lang: sum(w in distinctive for w in words) for lang, distinctive in _DISTINCTIVE.items()}
+    best = max(hits, key=hits.get)
+    others = max(v for lang, v in hits.items() if lang != best)
+    if hits[best] < 5 or hits[best] < 3 * others:
+        return None
+    return best
+
+
+def _shingles(text: str) -> FrozenSet[Tuple[str, ...]]:
+    words = normalize(text).split()
+    return frozenset(tuple(words[i:i + COPY_SHINGLE]) for i in range(len(words) - COPY_SHINGLE + 1))
+
+
+@lru_cache(maxsize=64)
+def _prompt_shingles(prompt_text: str) -> FrozenSet[Tuple[str, ...]]:
+    return _shingles(prompt_text)
+
+
+def copied_fraction(essay: str, prompt_text: str) -> float:
+    essay_shingles = _shingles(essay)
+    if not essay_shingles:
+        return 0.0
+    return len(essay_shingles & _prompt_shingles(prompt_text)) / len(essay_shingles)
+
+
+def check_essay(essay: str, exam_type: str, prompt_text: str = "") -> Optional[str]:
+    """Returns why the essay is clearly invalid ('empty', 'insufficient', 'language', 'copied'), or None."""
+    if not essay or not essay.strip():
+        return "empty"
+    expected = EXAM_ESSAY_LANGUAGE.get(exam_type)
+    if expected == "zh":
+        if len(_CJK.findall(essay)) < MIN_CJK_CHARS:
+            return "insufficient"
+    else:
+        words = len(essay.split())
+        if words < MIN_WORDS or (exam_type == "enem" and -(-words // WORDS_PER_LINE) < MIN_LINES):
+            return "insufficient"
+    detected = detect_language(essay)
+    if expected and detected and detected != expected:
+        return "language"
+    if prompt_text and copied_fraction(essay, prompt_text) >= COPY_THRESHOLD:
+        return "copied"
+    return None
+
+
+def zero_score_response(reason: str, rubric: Optional[Rubric], exam_type: str) -> str:
+    """The rubric's own JSON format with the lowest score in every criterion."""
+    message = MESSAGES[EXAM_ESSAY_LANGUAGE.get(exam_type, "en")][reason]
+    if rubric is None:
+        return json.dumps({"nota": 0, "feedback": message}, ensure_ascii=False)
+    response = {}
+    for field in rubric.schema.model_fields:
+        if field in rubric.scores:
+            response[field] = rubric.scores[field][0]
+        elif field == "justifications":
+            response[field] = {name: message for name in rubric.scores}
+        else:
+            response[field] = message
+    return json.dumps(response, ensure_ascii=False)
@@ -0,0 +1,192 @@
+from typing import Dict, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .utils import exams_types, prompt_competencia_1, prompt_competencia_2, prompt_competencia_3, prompt_competencia_4, prompt_competencia_5
+
+EXAM_LANGUAGES = {
+    "enem": "portuguese-Brasil",
+    "icfes": "spanish",
+    "exani": "spanish",
+    "sat": "english",
+    "cuet": "english",
+    "exames_nacionais": "portuguese-Portugal",
+    "gaokao": "chinese",
+    "ielts": "english"
+}
+
+COMPETENCIA_PROMPTS = [prompt_competencia_1, prompt_competencia_2, prompt_competencia_3, prompt_competencia_4, prompt_competencia_5]
+
+PromptKey = Tuple[str, str, bool, bool]  # (endpoint, exam_type, lite_rag, has_existing_items)
+
+# As mensagens fixas vêm primeiro e as variáveis ({covered}, {context}, {tema})
+# por último: o prefixo do prompt fica idêntico entre requisições e o Ollama
+# reaproveita o KV cache.
+
+QUESTION_STRUCTURE = """Follow the structure:
+            {{
+                "question": "string",
+                "A": "string",
+                "B": "string",
+                "C": "string",
+                "D": "string",
+                "E": "string",
+                "correct_answer": "A|B|C|D|E",
+                "explanation": "string"
+                }}
+        """
+
+SIMULADO_STRUCTURE = """Follow the structure:
+            {{
+                "questions": [
+                    {{
+                    "question": "string",
+                    "A": "string",
+                    "B": "string",
+                    "C": "string",
+                    "D": "string",
+                    "E": "string",
+                    "correct_answer": "A|B|C|D|E",
+                    "explanation": "string"
+                    }},
+                    ...
+                ]
+            }}
+        """
+
+FLASHCARD_STRUCTURE = """Follow EXACTLY this JSON structure:
+                {{
+                    "question": "Question about the concept...",
+                    "answer": "Clear and didactic answer..."
+                }}
+            """
+
+KEY_TOPICS_STRUCTURE = """Follow EXACTLY this JSON structure:
+            {{
+                "explanation": "A comprehensive and didactic explanation of the theme...",
+                "key_topics": [
+                    "First most important key point...",
+                    "Second most important key point...",
+                    "Third most important key point..."
+                ]
+            }}
+        """
+
+
+def simulado_messages(exam_type, lite_rag, has_existing_items):
+    template = [
+        ('system', f"""You will generate questions to compose an {exam_type} practice test."""),
+        ('system', f"""The language of the exam is {EXAM_LANGUAGES[exam_type]}."""),
+        ('system', "Don't create purely objective questions like 'What is?', 'Who was?', briefly contextualize the theme and create questions that require reasoning."),
+        ('system', SIMULADO_STRUCTURE),
+        ('system', "Generate 5 questions about the theme: {tema}"),
+    ]
+    if lite_rag:
+        template.append(('system', "Use the following content to support the questions (if the content is not relevant, ignore it):\n{context}"))
+    return template
+
+
+def simulado_questao_messages(exam_type, lite_rag, has_existing_items):
+    template = [
+        ('system', f"""You will generate questions to compose an {exam_type} practice test."""),
+        ('system', f"""The language of the exam is {EXAM_LANGUAGES[exam_type]}."""),
+        ('system', "Don't create purely objective questions like 'What is?', 'Who was?', create questions that require reasoning."),
+        ('system', QUESTION_STRUCTURE),
+    ]
+    if has_existing_items:
+        template.append(('system', "Do not repeat existing questions. These subtopics are already covered: {covered}."))
+    template.append(('system', """Generate only one question about the theme: {tema}\n"""))
+    if lite_rag:
+        template.append(('system', "Use the following content to support the question (if the content is not relevant, ignore it):\n{context}"))
+    return template
+
+
+def flashcard_messages(exam_type, lite_rag, has_existing_items):
+    template = [
+        ('system', """You will generate an educational flashcard for studying."""),
+        ('system', f"""The language of the exam is {EXAM_LANGUAGES[exam_type]}."""),
+        ('system', f"""Consider that the flashcard should be relevant for the {exam_type} exam."""),
+        ('system', """Create the flashcard in question-answer format."""),
+        ('system', FLASHCARD_STRUCTURE),
+        ('system', "The question should test essential knowledge and the answer should be complete."),
+        ('system', "Generate a flashcard about the theme: {tema}"),
+    ]
+    if lite_rag:
+        template.append(('system', "Use the following content to support the question (if the content is not relevant, ignore it):\n{context}"))
+    if has_existing_items:
+        template.append(('system', "Do not repeat existing questions. These subtopics are already covered: {covered}."))
+    return template
+
+
+def key_topics_messages(exam_type, lite_rag, has_existing_items):
+    template = [
+        ('system', """You will generate key topics about an educational theme."""),
+        ('system', f"""The language of the exam is {EXAM_LANGUAGES[exam_type]}."""),
+        ('system', f"""Consider that the key topics should be relevant for the {exam_type} exam."""),
+        ('system', """Create a general explanation of the theme and list the 3 most important key points."""),
+        ('system', KEY_TOPICS_STRUCTURE),
+        ('system', "The general explanation should be complete but accessible, and the 3 key topics should cover the most fundamental aspects."),
+        ('system', "Analyze the theme: {tema}"),
+    ]
+    if lite_rag:
+        template.append(('system', "Use the following content to support the explanation (if the content is not relevant, ignore it):\n{context}"))
+    return template
+
+
+def essay_messages(exam_type, lite_rag, has_existing_items):
+    return [
+        ("system", exams_types[exam_type]),
+        ("human", "Redação do usuário: {essay}")
+    ]
+
+
+# Etapa "reduce" da avaliação em trechos (redações maiores que o contexto do modelo)
+REDUCE_INSTRUCTION = ("A redação era longa demais para uma única avaliação e foi avaliada em {chunks} trechos. "
+                      "Avaliações parciais:\n\n{partials}\n\n"
+                      "Combine-as em uma única avaliação final da redação completa, no mesmo formato de resposta pedido.")
+
+
+GENERATION_BUILDERS = {
+    "call-simulado": simulado_messages,
+    "call-simulado-questao": simulado_questao_messages,
+    "call-flashcard": flashcard_messages,
+    "call-key-topics": key_topics_messages,
+}
+
+
+class PromptRegistry:
+    """Prompt templates compiled once at startup and shared by every request."""
+
+    def __init__(self):
+        self._prompts: Dict[PromptKey, ChatPromptTemplate] = {}
+
+    def __len__(self):
+        return len(self._prompts)
+
+    def register(self, endpoint, exam_type, lite_rag, has_existing_items, messages):
+        self._prompts[(endpoint, exam_type, lite_rag, has_existing_items)] = ChatPromptTemplate.from_messages(messages)
+
+    def get(self, endpoint, exam_type, lite_rag=False, has_existing_items=False) -> ChatPromptTemplate:
+        return self._prompts[(endpoint, exam_type, bool(lite_rag), bool(has_existing_items))]
+
+
+def build_registry() -> PromptRegistry:
+    registry = PromptRegistry()
+    for endpoint, builder in GENERATION_BUILDERS.items():
+        for exam_type in EXAM_LANGUAGES:
+            for lite_rag in (False, True):
+                for has_existing_items in (False, True):
+                    registry.register(endpoint, exam_type, lite_rag, has_existing_items,
+                                      builder(exam_type, lite_rag, has_existing_items))
+    for exam_type in exams_types:
+        registry.register("call-essay", exam_type, False, False, essay_messages(exam_type, False, False))
+        registry.register("call-essay/reduce", exam_type, False, False,
+                          [("system", exams_types[exam_type]), ("human", REDUCE_INSTRUCTION)])
+    for i, system_prompt in enumerate(COMPETENCIA_PROMPTS, start=1):
+        registry.register(f"call-model-competencia/{i}", "enem", False, False,
+                          [("system", system_prompt), ("human", "Redação do usuário: \n\n {essay}")])
+        registry.register(f"call-model-competencia/{i}/reduce", "enem", False, False,
+                          [("system", system_prompt), ("human", REDUCE_INSTRUCTION)])
+    registry.register("translate", "", False, False,
+                      [('system', "Traduza para o português (se possível, escreva 1 frase que descreva o tema): {tema}")])
+    return registry
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+import httpx
+
+from .ollama_admin import OllamaAdmin
+
+PULL_PROGRESS_HZ = float(os.getenv("PULL_PROGRESS_HZ", "4"))
+
+
+class PullJob:
+    def __init__(self, model: str):
+        self.model = model
+        self.started_at = time.time()
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.last_event: Optional[dict] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def broadcast(self, event: Optional[dict]):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "started_at": self.started_at,
+            "subscribers": len(self.subscribers),
+            "last_event": self.last_event,
+        }
+
+
+class PullManager:
+    """
+    One Ollama pull per model, fanned out to every client asking for it.
+
+    The pull keeps running if all clients disconnect, so a client can attach
+    again and resume from the latest progress event. Progress lines are
+    throttled to `rate` events per second; status changes, errors and the
+    final event are always forwarded.
+    """
+
+    def __init__(self, admin: OllamaAdmin, rate: float = PULL_PROGRESS_HZ):
+        self.admin = admin
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.jobs: Dict[str, PullJob] = {}
+
+    def in_progress(self, model: str) -> bool:
+        return model in self.jobs
+
+    async def aclose(self):
+        tasks = [job.task for job in self.jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def subscribe(self, model: str, start: bool = True) -> AsyncIterator[str]:
+        job = self.jobs.get(model)
+        if job is None:
+            if not start:
+                return
+            job = self.jobs[model] = PullJob(model)
+            job.task = asyncio.create_task(self._run(job))
+
+        queue: asyncio.Queue = asyncio.Queue()
+        if job.last_event is not None:
+            queue.put_nowait(job.last_event)
+        job.subscribers.add(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield json.dumps(event) + "\n"
+        finally:
+            job.subscribers.discard(queue)
+
+    async def _run(self, job: PullJob):
+        last_sent = 0.0
+        last_status = None
+        pending = None
+        try:
+            async with self.admin.client.stream("POST", "/api/pull", json={"model": job.model},
+                                                timeout=httpx.Timeout(10.0, read=None)) as response:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    job.last_event = event
+                    now = time.monotonic()
+                    status = event.get("status")
+                    if status != last_status or "error" in event or now - last_sent >= self.interval:
+                        job.broadcast(event)
+                        last_sent, last_status, pending = now, status, None
+                    else:
+                        pending = event
+            if pending is not None:
+                job.broadcast(pending)
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            job.last_event = {"error": str(e)}
+            job.broadcast(job.last_event)
+        finally:
+            self.jobs.pop(job.model, None)
+            self.admin.invalidate()
+            job.broadcast(None)
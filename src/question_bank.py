@@ -0,0 +1,92 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from .dedupe import DedupeIndex, normalize, tokenize
+from .prompts import EXAM_LANGUAGES
+from .schemas import Question
+
+QUESTION_BANK_MIN_UNSEEN = int(os.getenv("QUESTION_BANK_MIN_UNSEEN", "3"))
+SAMPLE_POOL = 200  # questões sorteadas do banco antes do filtro de já vistas
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    exam_type TEXT NOT NULL,
+    language TEXT NOT NULL,
+    theme_key TEXT NOT NULL,
+    question_hash TEXT NOT NULL,
+    question TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS questions_theme ON questions (exam_type, language, theme_key, question_hash);
+"""
+
+
+def theme_key(tema: str) -> str:
+    # "A Revolução Francesa" e "revolucao francesa" caem na mesma chave
+    return " ".join(sorted(set(tokenize(tema)))) or normalize(tema)
+
+
+class QuestionBank:
+    """
+    Persistent bank of validated generated questions, indexed by normalized
+    theme, exam_type and language, so repeated themes are served without an
+    LLM call.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _key(exam_type: str, tema: str):
+        return exam_type, EXAM_LANGUAGES.get(exam_type, ""), theme_key(tema)
+
+    def add(self, exam_type: str, tema: str, questions: List[Question]) -> int:
+        rows = [(*self._key(exam_type, tema),
+                 hashlib.blake2b(normalize(q.question).encode("utf-8"), digest_size=16).hexdigest(),
+                 q.model_dump_json(), time.time()) for q in questions]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO questions (exam_type, language, theme_key, question_hash, question, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def unseen(self, exam_type: str, tema: str, seen: DedupeIndex, limit: int) -> List[Question]:
+        """Up to `limit` random banked questions that are not near-duplicates of `seen`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM questions WHERE exam_type = ? AND language = ? AND theme_key = ? "
+                "ORDER BY random() LIMIT ?", (*self._key(exam_type, tema), SAMPLE_POOL)).fetchall()
+        selected = []
+        for (data,) in rows:
+            question = Question.model_validate_json(data)
+            if not seen.is_duplicate(question.question):
+                selected.append(question)
+                if len(selected) >= limit:
+                    break
+        return selected
+
+    def stats(self) -> dict:
+        with self._lock:
+            total, themes = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT exam_type || ':' || theme_key) FROM questions").fetchone()
+        return {"questions": total, "themes": themes}
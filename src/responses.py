@@ -0,0 +1,82 @@
+import json
+import zlib
+from typing import Any, Iterable, Iterator
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # opcional: só acelera a serialização
+    orjson = None
+
+GZIP_MIN_SIZE = 1024
+CHUNK_SIZE = 64 * 1024
+EXPORT_FORMATS = ("ndjson", "json")
+
+
+def dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def accepts_gzip(request: Request) -> bool:
+    return any(part.split(";")[0].strip() == "gzip"
+               for part in request.headers.get("accept-encoding", "").split(","))
+
+
+def json_response(request: Request, data: Any) -> Response:
+    """
+    Already-validated store records serialized straight to bytes (no
+    response_model round trip), gzipped when the client accepts it.
+    """
+    body = dumps(data)
+    headers = {"vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and accepts_gzip(request):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+        body = compressor.compress(body) + compressor.flush()
+        headers["content-encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _encode(records: Iterable[dict], fmt: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    # Agrupa os registros em blocos de ~64 KB: um yield por registro custaria uma ida ao threadpool cada
+    parts, size = [b"["] if fmt == "json" else [], 0
+    separator = b"\n" if fmt == "ndjson" else b","
+    first = True
+    for record in records:
+        encoded = dumps(record)
+        if fmt == "ndjson":
+            parts.append(encoded + separator)
+        else:
+            parts.append(encoded if first else separator + encoded)
+        first = False
+        size += len(encoded) + 1
+        if size >= chunk_size:
+            yield b"".join(parts)
+            parts, size = [], 0
+    if fmt == "json":
+        parts.append(b"]")
+    if parts:
+        yield b"".join(parts)
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # Z_SYNC_FLUSH por bloco: o cliente descomprime à medida que recebe
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def stream_records(request: Request, records: Iterable[dict], fmt: str, filename: str) -> StreamingResponse:
+    """Streams `records` as NDJSON or a JSON array while they are read, gzipped when accepted."""
+    chunks = _encode(records, fmt)
+    headers = {"vary": "Accept-Encoding",
+               "content-disposition": f'attachment; filename="{filename}.{fmt}"'}
+    if accepts_gzip(request):
+        chunks = _gzip(chunks)
+        headers["content-encoding"] = "gzip"
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
@@ -3,12 +3,45 @@ from pydantic import BaseModel
 import pandas as pd
 import numpy as np
 import re
+from functools import lru_cache
 import nltk
 from nltk.corpus import stopwords
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 nltk.download('stopwords')
 
+# Idioma NLTK dos editais/redações de cada exame
+EXAM_STOPWORD_LANGUAGES = {
+    'enem': 'portuguese',
+    'exames_nacionais': 'portuguese',
+    'icfes': 'spanish',
+    'exani': 'spanish',
+    'sat': 'english',
+    'cuet': 'english',
+    'ielts': 'english',
+}
+
+
+@lru_cache(maxsize=None)
+def get_stop_words(language):
+    # Carregadas uma vez por idioma (antes eram relidas a cada texto)
+    if language not in ('portuguese', 'english', 'spanish'):
+        return frozenset()
+    try:
+        return frozenset(stopwords.words(language))
+    except LookupError:
+        return frozenset()
+
+
+def preprocess_text(text, language=None):
+    stop_words = get_stop_words(language)
+    text = text.lower()
+    text = re.sub(r'\d+', '', text)
+    text = re.sub(r'\b\w{1,2}\b', '', text)
+    text = re.sub(r'[^\w\s]', '', text)
+    return ' '.join(word for word in text.split() if word not in stop_words)
+
+
 class Output(BaseModel):
     content: str
     relevance: float
@@ -71,24 +104,8 @@ class Retriever:
         output = [Output(content=x[0], relevance=x[1]) for x in output]
         return output
     
-    def preprocess_text(self, 
-                        text):
-        
-        if self.language == 'portuguese':
-            stop_words = set(stopwords.words('portuguese'))
-        elif self.language == 'english':
-            stop_words = set(stopwords.words('english'))
-        elif self.language == 'spanish':
-            stop_words = set(stopwords.words('spanish'))
-        else:
-            stop_words = set()
-        
-        text = text.lower()
-        text = re.sub(r'\d+', '', text)
-        text = re.sub(r'\b\w{1,2}\b', '', text)  
-        text = re.sub(r'[^\w\s]', '', text) 
-        text = ' '.join(word for word in text.split() if word not in stop_words)
-        return text
+    def preprocess_text(self, text):
+        return preprocess_text(text, self.language)
     
     def save_model(self, filename='../vectorstore/tfidf_model.pkl'):
         # Salvar o modelo TF-IDF em um arquivo .pkl
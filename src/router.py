@@ -0,0 +1,108 @@
+import math
+import os
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from . import telemetry, tracing
+from .ollama_admin import OllamaAdmin
+from .utils import model_names
+
+AUTO_MODEL = "auto"
+DEFAULT_MODEL = "gemma3n:e2b"
+OLLAMA_NUM_PARALLEL = max(1, int(os.getenv("OLLAMA_NUM_PARALLEL", "1")))
+
+# Meta de latência (segundos) por endpoint; sobrescreva com ROUTER_SLA="call-essay=30,call-flashcard=8"
+DEFAULT_SLA = {
+    "call-simulado": 120.0,
+    "call-simulado-questao": 20.0,
+    "call-flashcard": 10.0,
+    "call-key-topics": 20.0,
+    "call-essay": 60.0,
+    "call-model-competencia": 30.0,
+}
+
+# Tokens gerados esperados por endpoint, para converter tokens/s em latência
+EXPECTED_TOKENS = {
+    "call-simulado": 2500,
+    "call-simulado-questao": 300,
+    "call-flashcard": 150,
+    "call-key-topics": 300,
+    "call-essay": 800,
+    "call-model-competencia": 400,
+}
+
+# Velocidade inicial (tokens/s em CPU) até a telemetria medir o modelo
+PRIOR_SPEED = {
+    "gemma3:1b": 60.0,
+    "gemma3n:e2b": 30.0,
+    "gemma3:4b": 22.0,
+    "gemma3n:e4b": 16.0,
+    "gemma3:12b": 7.0,
+    "gemma3:27b": 3.0,
+}
+
+
+def _parse_sla(value: str) -> Dict[str, float]:
+    sla = dict(DEFAULT_SLA)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        endpoint, _, seconds = item.partition("=")
+        sla[endpoint.strip()] = float(seconds)
+    return sla
+
+
+class ModelRouter:
+    """
+    Resolves `model_name: "auto"` to one of `model_names` (ordered from the
+    smallest to the largest). Picks the largest installed model whose
+    estimated latency fits the endpoint's SLA, given the calls already in
+    flight on it and its measured decode speed; under load it degrades to
+    smaller models, and if nothing fits it takes the fastest estimate.
+    """
+
+    def __init__(self, admin: OllamaAdmin, candidates: List[str] = model_names,
+                 sla: Optional[Dict[str, float]] = None):
+        self.admin = admin
+        self.candidates = list(candidates)
+        self.sla = sla if sla is not None else _parse_sla(os.getenv("ROUTER_SLA", ""))
+        self.inflight: Dict[str, int] = {}
+
+    def estimate(self, endpoint: str, model: str) -> float:
+        speed = telemetry.decode_speed.get(model) or PRIOR_SPEED.get(model, 10.0)
+        waves = math.ceil((self.inflight.get(model, 0) + 1) / OLLAMA_NUM_PARALLEL)
+        return waves * EXPECTED_TOKENS.get(endpoint, 500) / speed
+
+    async def resolve(self, endpoint: str, model_name: str) -> str:
+        if model_name != AUTO_MODEL:
+            tracing.set_attribute("model", model_name)
+            return model_name
+
+        installed = [m for m in self.candidates if await self.admin.has_model(m)]
+        if not installed:
+            chosen = DEFAULT_MODEL
+        else:
+            target = self.sla.get(endpoint, 60.0)
+            estimates = {m: self.estimate(endpoint, m) for m in installed}
+            fitting = [m for m in installed if estimates[m] <= target]
+            chosen = fitting[-1] if fitting else min(installed, key=estimates.get)
+
+        telemetry.router_decisions.inc(endpoint=endpoint, model=telemetry.model_label(chosen))
+        tracing.set_attribute("model", chosen)
+        tracing.set_attribute("model_routed", True)
+        return chosen
+
+    @contextmanager
+    def busy(self, model_name: str):
+        # Profundidade de fila por modelo: chamadas ao Ollama em andamento
+        self.inflight[model_name] = self.inflight.get(model_name, 0) + 1
+        try:
+            yield
+        finally:
+            self.inflight[model_name] -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "candidates": self.candidates,
+            "sla": self.sla,
+            "inflight": {m: n for m, n in self.inflight.items() if n},
+            "tokens_per_second": {m: round(s, 2) for m, s in telemetry.decode_speed.items()},
+        }
@@ -1,41 +1,64 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Dict, Optional, List, Literal
 from .utils import example_essay
 
+# Nome de modelo do Ollama (gemma3n:e2b, usuario/modelo:tag) ou "auto"; também vai no header x-served-model
+ModelName = Annotated[str, StringConstraints(pattern=r"^[A-Za-z0-9][A-Za-z0-9._:/-]{0,127}$")]
+
 class InputDataEssayEnem(BaseModel):
     essay: str = example_essay
-    model_name: str = "gemma3n:e2b"
+    model_name: ModelName = "gemma3n:e2b"
     competencia: int = 1
+    cascade: None | bool = False # grade with a small model first, escalate to model_name when unsure
+    fresh: None | bool = False # regrade even when a near-duplicate was already graded
     
 class InputDataEssay(BaseModel):
     essay: str = example_essay
-    model_name: str = "gemma3n:e2b"
+    model_name: ModelName = "gemma3n:e2b"
     exam_type: None | str = "enem"  # it can be 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais'
+    cascade: None | bool = False # grade with a small model first, escalate to model_name when unsure
+    fresh: None | bool = False # regrade even when a near-duplicate was already graded
     
 class InputSimulado(BaseModel):
     tema: str = "world war ii"
-    model_name: str = "gemma3n:e2b"
+    model_name: ModelName = "gemma3n:e2b"
     questions: Optional[List[str]] = []
     exam_type: None | str = "enem" # it can be 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais'
     lite_rag: None | bool = False
+    stream: None | bool = False # NDJSON, one question per line as soon as it is complete
+    session_id: Optional[str] = None # dedupe index scope; defaults to exam_type + theme
+    fresh: None | bool = False # skip the question bank and always generate
 
 class InputFlashcard(BaseModel):
     tema: str = "world war ii"
     flashcards_existentes: Optional[List[str]] = []
-    model_name: str = "gemma3n:e2b"
+    model_name: ModelName = "gemma3n:e2b"
     exam_type: None | str = "enem"  # it can be 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais'
     lite_rag: None | bool = False
+    session_id: Optional[str] = None # dedupe index scope; defaults to exam_type + theme
 
 class InputDataKeyTopics(BaseModel):
     tema: str = "world war ii"
-    model_name: str = "gemma3n:e2b"
+    model_name: ModelName = "gemma3n:e2b"
     exam_type: None | str = "enem"  # it can be 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais'
     lite_rag: None | bool = False
 
+class CascadeInfo(BaseModel):
+    first_pass_model: str
+    escalated: bool
+    reason: Optional[str] = None # 'boundary', 'invalid' or 'unavailable' when escalated
+
+class DuplicateInfo(BaseModel):
+    distance: int # SimHash bits differing from the essay graded before
+    graded_at: float
+
 class OutputDataEssayEnem(BaseModel):
     response: str
     model: str
     competencia: int
+    cascade: Optional[CascadeInfo] = None
+    rejected: Optional[str] = None # pre-check reason ('empty', 'insufficient', 'language', 'copied'); no LLM call
+    duplicate: Optional[DuplicateInfo] = None # set when the grade was reused from a near-duplicate essay
     
 class Essay(BaseModel):
     essay_id: None | int = Field(default=None, description="Unique identifier for the essay")
@@ -43,9 +66,74 @@ class Essay(BaseModel):
     grade: int
     exam_type: Optional[str] = "enem"  # it can be 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais'
     feedback: Optional[str] = ""
+    created_at: None | float = Field(default=None, description="Creation time (Unix seconds), set by the store")
+
+class EssayPage(BaseModel):
+    items: List[Essay]
+    next_cursor: None | int = None  # pass back as `cursor` to get the next (older) page
     
 class InputEssay(BaseModel):
     essay: str
     grade: int
     exam_type: Optional[str] = "enem"  # it can be 'enem', 'icfes', 'exani', 'sat', 'cuet', 'exames_nacionais'
     feedback: Optional[str] = ""
+
+
+# Structured outputs (JSON schema enviado ao Ollama via `format`)
+class Question(BaseModel):
+    question: str
+    A: str
+    B: str
+    C: str
+    D: str
+    E: str
+    correct_answer: Literal["A", "B", "C", "D", "E"]
+    explanation: str
+
+class Simulado(BaseModel):
+    questions: List[Question]
+
+class Flashcard(BaseModel):
+    question: str
+    answer: str
+
+class KeyTopics(BaseModel):
+    explanation: str
+    key_topics: List[str] = Field(min_length=3, max_length=3)
+
+
+# Notas estruturadas (modo cascata). Os campos seguem o formato JSON pedido em cada rubrica.
+CompetenciaNota = Literal[0, 40, 80, 120, 160, 200] # níveis de 40 em 40 da matriz do ENEM
+
+class CompetenciaGrade(BaseModel):
+    nota: CompetenciaNota
+    feedback: str
+    justificativa: str
+
+class SatGrade(BaseModel):
+    reading: int = Field(ge=1, le=4)
+    analysis: int = Field(ge=1, le=4)
+    writing: int = Field(ge=1, le=4)
+    justifications: Dict[str, str]
+    feedback: str
+
+class ExamesNacionaisGrade(BaseModel):
+    structure_thematic_and_discursive: int = Field(ge=0, le=20)
+    linguistic_correction: int = Field(ge=0, le=20)
+    justifications: Dict[str, str]
+    feedback: str
+
+class GaokaoGrade(BaseModel):
+    basic_content: int = Field(ge=0, le=20)
+    basic_expression: int = Field(ge=0, le=20)
+    development_level: int = Field(ge=0, le=20)
+    justifications: Dict[str, str]
+    feedback: str
+
+class IeltsGrade(BaseModel):
+    task_achievement_response: float = Field(ge=0, le=9)
+    coherence_cohesion: float = Field(ge=0, le=9)
+    lexical_resource: float = Field(ge=0, le=9)
+    grammatical_range_accuracy: float = Field(ge=0, le=9)
+    justifications: Dict[str, str]
+    feedback: str
@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .utils import model_names
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320)
+TOKEN_COUNT_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for i, bound in enumerate(self.buckets):
+                    le = _format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {state[i]}")
+                le = _format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {state[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+LLM_LABELS = ("endpoint", "model", "exam_type", "chain")
+KNOWN_MODELS = frozenset(model_names)
+
+
+def model_label(model: str) -> str:
+    # model_name vem do cliente: nomes fora da lista viram "other" para não criar séries sem limite
+    return model if model in KNOWN_MODELS else "other"
+
+llm_requests = registry.counter(
+    "neroedu_llm_requests_total", "LLM chain invocations.", LLM_LABELS + ("status",))
+llm_prompt_tokens = registry.counter(
+    "neroedu_llm_prompt_tokens_total", "Prompt tokens evaluated by Ollama (prompt_eval_count).", LLM_LABELS)
+llm_eval_tokens = registry.counter(
+    "neroedu_llm_eval_tokens_total", "Tokens generated by Ollama (eval_count).", LLM_LABELS)
+llm_duration = registry.histogram(
+    "neroedu_llm_request_duration_seconds", "Wall time of each LLM call.", LLM_LABELS)
+llm_ttft = registry.histogram(
+    "neroedu_llm_ttft_seconds", "Time to first generated token.", LLM_LABELS)
+llm_load = registry.histogram(
+    "neroedu_llm_load_duration_seconds", "Model load time reported by Ollama (load_duration).", LLM_LABELS)
+llm_eval = registry.histogram(
+    "neroedu_llm_eval_duration_seconds", "Decode time reported by Ollama (eval_duration).", LLM_LABELS)
+llm_tokens_per_second = registry.histogram(
+    "neroedu_llm_tokens_per_second", "Decode speed (eval_count / eval_duration).", LLM_LABELS,
+    buckets=TOKENS_PER_SECOND_BUCKETS)
+llm_prompt_size = registry.histogram(
+    "neroedu_llm_prompt_tokens", "Prompt size per call, to spot oversized prompts.", LLM_LABELS,
+    buckets=TOKEN_COUNT_BUCKETS)
+router_decisions = registry.counter(
+    "neroedu_router_decisions_total", "Models picked by the `model_name: auto` router.", ("endpoint", "model"))
+cascade_grades = registry.counter(
+    "neroedu_cascade_grades_total", "Cascade first-pass outcomes (accepted, boundary, invalid).", ("endpoint", "outcome"))
+essays_rejected = registry.counter(
+    "neroedu_essays_rejected_total", "Essays answered with a zero score by the local pre-check, without an LLM call.",
+    ("endpoint", "reason"))
+question_bank_requests = registry.counter(
+    "neroedu_question_bank_requests_total", "Question requests by source (bank or live generation).",
+    ("endpoint", "source"))
+essay_cache_requests = registry.counter(
+    "neroedu_essay_cache_requests_total", "Essay gradings by source (a near-duplicate graded before, or live).",
+    ("endpoint", "source"))
+prefetch_requests = registry.counter(
+    "neroedu_prefetch_requests_total", "Session requests served from the prefetch buffer (hit, miss, stale).",
+    ("endpoint", "outcome"))
+requests_cancelled = registry.counter(
+    "neroedu_requests_cancelled_total", "Generation requests cancelled because the client disconnected.",
+    ("endpoint",))
+
+# Média móvel exponencial de tokens/s por modelo, lida pelo roteador de modelos
+SPEED_ALPHA = 0.3
+decode_speed: Dict[str, float] = {}
+
+
+def record_decode_speed(model: str, tokens_per_second: float):
+    previous = decode_speed.get(model)
+    if previous is None:
+        decode_speed[model] = tokens_per_second
+    else:
+        decode_speed[model] = SPEED_ALPHA * tokens_per_second + (1 - SPEED_ALPHA) * previous
+
+
+class LLMTelemetry(BaseCallbackHandler):
+    """LangChain callback that turns Ollama's response metadata into metrics."""
+
+    run_inline = True
+
+    def __init__(self, endpoint: str, exam_type: Optional[str] = None, chain: str = "generate"):
+        self.endpoint = endpoint
+        self.exam_type = exam_type or ""
+        self.chain = chain
+        self._runs = {}  # run_id -> [model, started, first_token]
+
+    def _labels(self, model):
+        return {"endpoint": self.endpoint, "model": model_label(model), "exam_type": self.exam_type,
+                "chain": self.chain}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name", "")
+        self._runs[run_id] = [model, time.perf_counter(), None]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and run[2] is None:
+            run[2] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        model, started, first_token = run
+        info = {}
+        if response.generations and response.generations[0]:
+            info = response.generations[0][0].generation_info or {}
+        model = info.get("model") or model
+        labels = self._labels(model)
+
+        llm_requests.inc(status="ok", **labels)
+        llm_duration.observe(time.perf_counter() - started, **labels)
+        if first_token is not None:
+            llm_ttft.observe(first_token - started, **labels)
+
+        prompt_tokens = info.get("prompt_eval_count") or 0
+        eval_tokens = info.get("eval_count") or 0
+        eval_seconds = (info.get("eval_duration") or 0) / 1e9
+        llm_prompt_tokens.inc(prompt_tokens, **labels)
+        llm_eval_tokens.inc(eval_tokens, **labels)
+        llm_prompt_size.observe(prompt_tokens, **labels)
+        if info.get("load_duration") is not None:
+            llm_load.observe(info["load_duration"] / 1e9, **labels)
+        if eval_seconds > 0:
+            llm_eval.observe(eval_seconds, **labels)
+            llm_tokens_per_second.observe(eval_tokens / eval_seconds, **labels)
+            record_decode_speed(model, eval_tokens / eval_seconds)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        labels = self._labels(run[0])
+        status = "cancelled" if isinstance(error, (asyncio.CancelledError, GeneratorExit)) else "error"
+        llm_requests.inc(status=status, **labels)
+        llm_duration.observe(time.perf_counter() - run[1], **labels)
+
+
+def track(endpoint: str, exam_type: Optional[str] = None, chain: str = "generate") -> dict:
+    """Runnable config that records telemetry for one chain invocation."""
+    return {"callbacks": [LLMTelemetry(endpoint, exam_type, chain)]}
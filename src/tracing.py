@@ -0,0 +1,186 @@
+import contextvars
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+from urllib.parse import quote
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # opcional
+    PyinstrumentProfiler = None
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "256"))
+# X-Profile sem token válido só é atendido nessa fração: o profiler desacelera todas as requisições em curso
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")  # X-Profile-Token igual a este perfila sempre
+PROFILE_HEADER = b"x-profile"
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+traces: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+_profiling = False  # um profiler por vez (cProfile é global ao interpretador)
+
+
+class Trace:
+    def __init__(self, method: str, path: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[dict] = []
+        self.attributes: dict = {}
+        self.profile: Optional[str] = None
+
+    def add_span(self, name: str, started: float, ended: float):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((started - self._started) * 1000, 3),
+            "duration_ms": round((ended - started) * 1000, 3),
+        })
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def server_timing(self) -> str:
+        totals = {}
+        for s in self.spans:
+            totals[s["name"]] = totals.get(s["name"], 0.0) + s["duration_ms"]
+        parts = [f"{name};dur={duration:.1f}" for name, duration in totals.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self, include_profile: bool = False) -> dict:
+        data = {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "spans": self.spans,
+            "attributes": self.attributes,
+            "profiled": self.profile is not None,
+        }
+        if include_profile:
+            data["profile"] = self.profile
+        return data
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str):
+    """Times a stage of the current request (no-op outside a traced request)."""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add_span(name, started, time.perf_counter())
+
+
+def set_attribute(key: str, value):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes[key] = value
+
+
+def get_trace(trace_id: str) -> Optional[Trace]:
+    for trace in traces:
+        if trace.trace_id == trace_id:
+            return trace
+    return None
+
+
+class _Profiler:
+    def __init__(self, kind: str):
+        self.kind = "pyinstrument" if kind == "pyinstrument" and PyinstrumentProfiler else "cprofile"
+        if self.kind == "pyinstrument":
+            self._profiler = PyinstrumentProfiler(async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> str:
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+            return self._profiler.output_text()
+        self._profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        return out.getvalue()
+
+
+def _profile_authorized(token: Optional[bytes]) -> bool:
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN.encode("latin-1"))
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: one Trace per HTTP request, kept in a ring buffer and
+    summarised in a `Server-Timing` header. Sending `X-Profile: 1` (or
+    `X-Profile: pyinstrument`) profiles the request: always with a matching
+    `X-Profile-Token`, otherwise for a PROFILE_SAMPLE_RATE sample.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace = Trace(scope.get("method", ""), scope.get("path", ""))
+        token = _current_trace.set(trace)
+
+        global _profiling
+        profiler = None
+        headers = dict(scope.get("headers") or [])
+        profile_kind = headers.get(PROFILE_HEADER)
+        if profile_kind and not _profiling and (_profile_authorized(headers.get(PROFILE_TOKEN_HEADER))
+                                                or random.random() < PROFILE_SAMPLE_RATE):
+            _profiling = True
+            profiler = _Profiler(profile_kind.decode("latin-1").strip().lower())
+            profiler.start()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                if trace.attributes.get("model"):
+                    # Percent-encoded: um nome fora do latin-1 (ou com CR/LF) não pode quebrar a resposta
+                    served = quote(str(trace.attributes["model"]), safe=":/._-")
+                    headers.append((b"x-served-model", served.encode("ascii")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profiler is not None:
+                trace.profile = profiler.stop()
+                _profiling = False
+            trace.duration_ms = round(trace.elapsed_ms(), 3)
+            traces.append(trace)
+            _current_trace.reset(token)
@@ -1,29 +1,19 @@
-import requests
-
-BASE_URL = "http://localhost:11434"
-
-
-def get_models_info():
-    response = requests.get(f"{BASE_URL}/api/tags")
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": "Failed to fetch models info"}
-
-
-def delete_model(model_name):
-    url = f"{BASE_URL}/api/delete"
-    payload = {"model": model_name}
-    response = requests.delete(url, json=payload)
-
-    if response.status_code == 200:
-        return {"message": f"Model '{model_name}' deleted successfully"}
-    else:
-        return {
-            "error": f"Failed to delete model '{model_name}'",
-            "status_code": response.status_code,
-            "response": response.text
-        }
+import os
+
+# Mesmo env var usado pelo Ollama (e pelo cliente `ollama` dentro do ChatOllama)
+OLLAMA_BASE_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+if "://" not in OLLAMA_BASE_URL:
+    OLLAMA_BASE_URL = f"http://{OLLAMA_BASE_URL}"
+
+# Do mais leve ao mais pesado; o roteador de `model_name: "auto"` escolhe entre eles
+model_names = [
+    "gemma3:1b", # 800MB, bom pra testar os endpoints
+    "gemma3n:e2b", # Text, Audio, Image
+    "gemma3:4b", # Text, Image
+    "gemma3n:e4b", # Text, Audio, Image
+    "gemma3:12b",
+    "gemma3:27b"
+]
 
 
 example_essay = """
@@ -0,0 +1,10 @@
+import asyncio
+from argparse import Namespace
+
+from bench.credit_debit_race import run_bench
+
+
+def test_concurrent_debits_never_overdraw():
+    # 80 cobranças concorrentes contra 30 créditos: exatamente 30 aceitas, saldo 0, um Item por cobrança
+    args = Namespace(clients=8, requests=10, credits=30, url=None)
+    assert asyncio.run(run_bench(args)) == []
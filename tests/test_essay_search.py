@@ -0,0 +1,38 @@
+from src.essay_search import EssaySearchIndex
+
+
+def make_index(tmp_path, items):
+    index = EssaySearchIndex(str(tmp_path / "essay_search.sqlite3"))
+    index.open()
+    for item in items:
+        index.index(item)
+    return index
+
+
+def test_accented_query_matches_accented_essay(tmp_path):
+    items = {1: {"essay_id": 1, "exam_type": "enem", "grade": 800,
+                 "essay": "A educação pública exige intervenção contra a violência.",
+                 "feedback": "Proposta de intervenção bem detalhada."}}
+    index = make_index(tmp_path, items.values())
+    try:
+        for query in ("educação", "intervenção", "violência", "educacao"):
+            results = index.search(query, items.get)
+            assert [r["essay_id"] for r in results] == [1], query
+        assert "<mark>educação</mark>" in index.search("educação", items.get)[0]["snippet"]
+    finally:
+        index.close()
+
+
+def test_snippet_escapes_essay_markup(tmp_path):
+    items = {1: {"essay_id": 1, "exam_type": "enem", "grade": 600,
+                 "essay": "A educação <script>alert(1)</script> precisa de <b>investimento</b> & cuidado.",
+                 "feedback": ""}}
+    index = make_index(tmp_path, items.values())
+    try:
+        result = index.search("educação", items.get)[0]["snippet"]
+        assert "<script>" not in result and "<b>" not in result
+        assert "&lt;script&gt;alert(1)&lt;/script&gt;" in result
+        assert "&amp;" in result
+        assert "<mark>educação</mark>" in result
+    finally:
+        index.close()
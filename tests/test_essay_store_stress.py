@@ -0,0 +1,9 @@
+from argparse import Namespace
+
+from bench.essay_store_stress import run_bench
+
+
+def test_concurrent_writers_with_compaction():
+    # 4 processos x 2 threads; compactação a cada 50 registros mantém o journal rotacionando durante o teste
+    args = Namespace(processes=4, threads=2, ops=60, backend="journal", compact_every=50)
+    assert run_bench(args) == []